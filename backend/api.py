@@ -1,34 +1,71 @@
 """
 api.py — FastAPI application for the Research Assistant Agent.
 Endpoints:
-  POST   /sessions                    Create a new research session
-  GET    /sessions                    List all sessions
+  POST   /sessions                    Create a new research session (or reuse a similar one)
+  GET    /sessions                    List session summaries (keyset-paginated)
   GET    /sessions/{id}               Get session details + analysts
   GET    /sessions/{id}/report        Get the final report
   POST   /sessions/{id}/feedback      Submit human feedback (approve or text)
   GET    /sessions/{id}/stream        SSE — stream live agent progress
-  DELETE /sessions/{id}               Delete a session
+  POST   /sessions/{id}/cancel        Cancel a running session
+  DELETE /sessions/{id}               Delete a session (cancelling it first)
+  GET    /cache/stats                 Cache hit/miss counters
+  GET    /scheduler/stats             Session slot usage and queue length
+  GET    /ratelimit/stats             Upstream throttle wait and retry counters
+  GET    /search?q=                   Full-text search over topics, reports and analysts
+  GET    /sessions/{id}/timeline      Per-node spans (time, tokens, retrieval)
+  GET    /metrics                     Prometheus text exposition
 """
 import asyncio
+import hashlib
 import json
 import os
+import socket
 import sys
-from contextlib import asynccontextmanager
-from typing import Optional
+import time
+import uuid
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+import aiosqlite
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from pydantic import BaseModel
 from sse_starlette.sse import EventSourceResponse
 from sqlalchemy.orm import Session
 load_dotenv()
 sys.path.insert(0, os.path.dirname(__file__))
-from database import SessionStatus, get_db, init_db
+from database import CHECKPOINT_DB_PATH, SessionLocal, SessionStatus, get_db, init_db
+import budget
+import cancellation
 import crud
+import metrics
+from cache import llm_response_cache, normalize_query, retrieval_cache
+from cancellation import SessionCancelled, raise_if_cancelled
+from ratelimit import limiters
+from scheduler import QueueFullError, scheduler
+from schemas import Analyst, InterviewPolicy
+import similarity
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    yield
+    import main
+    async with aiosqlite.connect(CHECKPOINT_DB_PATH) as conn:
+        checkpointer = AsyncSqliteSaver(conn, serde=main.checkpoint_serde)
+        main.graph = main.compile_graph(checkpointer)
+        resume_interrupted_sessions()
+        gc_task = asyncio.create_task(collect_event_logs())
+        claims_task = asyncio.create_task(maintain_session_claims())
+        yield
+        gc_task.cancel()
+        claims_task.cancel()
+        # Let the next process resume this one's sessions without waiting out the lease
+        with SessionLocal() as db:
+            crud.release_claims(db, WORKER_ID)
 app = FastAPI(
     title="Research Assistant Agent API",
     description="API to run multi-analyst AI research reports powered by LangGraph + Gemini.",
@@ -41,10 +78,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=int(os.environ.get("GZIP_MIN_BYTES", 1024)))
 class CreateSessionRequest(BaseModel):
     topic: str
     max_analysts: int = 3
+    bypass_llm_cache: bool = False
+    priority: int = 0
+    interview_policy: InterviewPolicy = InterviewPolicy()
+    # Soft limits on the run's LLM spend, in tokens and USD (None = unbounded)
+    token_budget: Optional[int] = None
+    cost_budget: Optional[float] = None
+    # What to do when a completed session on a near-duplicate topic exists:
+    # "suggest" reports it alongside the new session, "return" returns it
+    # instead of starting a run, "seed" starts a run with its analysts,
+    # "off" skips the lookup.
+    reuse: Literal["suggest", "return", "seed", "off"] = "suggest"
 class FeedbackRequest(BaseModel):
     feedback: str  
 class AnalystOut(BaseModel):
@@ -83,10 +133,48 @@ def session_to_dict(s) -> dict:
         "max_analysts": s.max_analysts,
         "status": s.status.value if hasattr(s.status, "value") else s.status,
         "human_analyst_feedback": s.human_analyst_feedback,
+        "options": json.loads(s.options) if s.options else None,
+        "budget": session_budget_to_dict(s),
         "created_at": s.created_at.isoformat() if s.created_at else None,
         "updated_at": s.updated_at.isoformat() if s.updated_at else None,
         "analysts": [analyst_to_dict(a) for a in (s.analysts or [])],
     }
+def session_budget(s) -> budget.Budget:
+    """Live budget of a session running in this process, else its last stored spend."""
+    return budget.get(s.id) or budget.Budget(
+        token_limit=s.token_budget,
+        cost_limit=s.cost_budget,
+        tokens_spent=s.tokens_spent or 0,
+        cost_spent=s.cost_spent or 0.0,
+    )
+def session_budget_to_dict(s) -> dict:
+    b = session_budget(s)
+    return {
+        "token_budget": b.token_limit,
+        "cost_budget": b.cost_limit,
+        "tokens_spent": b.tokens_spent,
+        "cost_spent": round(b.cost_spent, 6),
+        "tokens_remaining": b.tokens_remaining,
+        "cost_remaining": round(b.cost_remaining, 6) if b.cost_remaining is not None else None,
+    }
+def session_summary_to_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "topic": row.topic,
+        "max_analysts": row.max_analysts,
+        "status": row.status.value if hasattr(row.status, "value") else row.status,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "analyst_count": row.analyst_count,
+    }
+def encode_cursor(row) -> str:
+    return f"{row.created_at.isoformat()}_{row.id}"
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, session_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(session_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
 def analyst_to_dict(a) -> dict:
     return {
         "id": a.id,
@@ -95,6 +183,20 @@ def analyst_to_dict(a) -> dict:
         "affiliation": a.affiliation,
         "description": a.description,
     }
+def span_to_dict(t) -> dict:
+    return {
+        "session_id": t.session_id,
+        "node": t.node,
+        "analyst": t.analyst,
+        "started_at": t.started_at.isoformat(),
+        "duration_ms": t.duration_ms,
+        "llm_calls": t.llm_calls,
+        "prompt_tokens": t.prompt_tokens,
+        "completion_tokens": t.completion_tokens,
+        "retrieval_ms": t.retrieval_ms,
+        "documents": t.documents,
+        "error": t.error,
+    }
 def report_to_dict(r) -> dict:
     return {
         "id": r.id,
@@ -105,78 +207,481 @@ def report_to_dict(r) -> dict:
         "final_report": r.final_report,
         "created_at": r.created_at.isoformat() if r.created_at else None,
     }
-_sse_queues: dict[int, asyncio.Queue] = {}
-def get_or_create_queue(session_id: int) -> asyncio.Queue:
-    if session_id not in _sse_queues:
-        _sse_queues[session_id] = asyncio.Queue()
-    return _sse_queues[session_id]
+REVALIDATE_CACHE_CONTROL = "no-cache"
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the values that determine a response body."""
+    return '"' + hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20] + '"'
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+def conditional_response(request: Request, etag: str, cache_control: str, build_body) -> Response:
+    """304 when the client already holds `etag`; otherwise serialize `build_body()`."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build_body(), headers=headers)
+# Subscribers poll the log only to see events written by other workers:
+# from EVENT_POLL_SECONDS, doubling while idle up to EVENT_POLL_MAX_SECONDS
+EVENT_POLL_SECONDS = float(os.environ.get("EVENT_POLL_SECONDS", 1))
+EVENT_POLL_MAX_SECONDS = float(os.environ.get("EVENT_POLL_MAX_SECONDS", 15))
+EVENT_KEEPALIVE_SECONDS = 30
+EVENT_RETENTION_SECONDS = float(os.environ.get("EVENT_RETENTION_SECONDS", 3600))
+EVENT_GC_INTERVAL_SECONDS = float(os.environ.get("EVENT_GC_INTERVAL_SECONDS", 300))
+# One wake-up Event per session with subscribers in this process, replaced
+# after each wake-up and dropped when the session's last subscriber leaves
+_event_signals: dict[int, asyncio.Event] = {}
+_subscriber_counts: dict[int, int] = {}
 async def push_event(session_id: int, event_type: str, data: dict):
-    """Push an SSE event to the queue for a session."""
-    q = get_or_create_queue(session_id)
-    await q.put({"event": event_type, "data": json.dumps(data)})
-async def run_agent(session_id: int, topic: str, max_analysts: int):
+    """Append an SSE event to the session's log and wake local subscribers."""
+    await push_events(session_id, [(event_type, data)])
+async def push_events(session_id: int, events: list[tuple[str, dict]]):
+    """Append several SSE events to the session's log in one transaction."""
+    with SessionLocal() as db:
+        crud.append_events(db, session_id, [(event, json.dumps(data)) for event, data in events])
+    wake_subscribers(session_id)
+def wake_subscribers(session_id: int):
+    signal = _event_signals.get(session_id)
+    if signal is not None:
+        _event_signals[session_id] = asyncio.Event()
+        signal.set()
+async def subscribe_events(session_id: int, last_event_id: int = 0, finished: bool = False):
     """
-    Run the LangGraph research graph in a background thread.
-    Pushes SSE events at each key stage.
+    Yield a session's logged events after `last_event_id`, then follow the log
+    until its `end` event. Subscribers in this process are woken by
+    push_event; events appended by other workers are picked up by a
+    backed-off poll (see EVENT_POLL_SECONDS). `finished` stops once the log
+    is drained, and so does the session being deleted.
     """
-    from database import SessionLocal
-    db = SessionLocal()
+    _subscriber_counts[session_id] = _subscriber_counts.get(session_id, 0) + 1
+    _event_signals.setdefault(session_id, asyncio.Event())
     try:
-        from main import graph
-        crud.update_session_status(db, session_id, SessionStatus.running)
-        await push_event(session_id, "status", {"message": "Agent started", "status": "running"})
-        thread_config = {"configurable": {"thread_id": str(session_id)}}
-        loop = asyncio.get_event_loop()
-        def _invoke_step1():
-            return graph.invoke(
-                {"topic": topic, "max_analysts": max_analysts},
-                thread_config,
+        async with aclosing(follow_event_log(session_id, last_event_id, finished)) as events:
+            async for item in events:
+                yield item
+    finally:
+        _subscriber_counts[session_id] -= 1
+        if not _subscriber_counts[session_id]:
+            del _subscriber_counts[session_id]
+            del _event_signals[session_id]
+async def follow_event_log(session_id: int, last_event_id: int, finished: bool):
+    idle = 0.0
+    poll = EVENT_POLL_SECONDS
+    while True:
+        signal = _event_signals[session_id]
+        with SessionLocal() as db:
+            events = [
+                (e.id, e.event, e.data) for e in crud.list_events(db, session_id, last_event_id)
+            ]
+            if not events and not finished:
+                finished = crud.get_session(db, session_id) is None
+        for event_id, event, data in events:
+            last_event_id = event_id
+            if event == "end":
+                return
+            yield {"id": str(event_id), "event": event, "data": data}
+        if events:
+            idle = 0.0
+            poll = EVENT_POLL_SECONDS
+            continue
+        if finished:
+            return
+        try:
+            await asyncio.wait_for(signal.wait(), timeout=poll)
+        except asyncio.TimeoutError:
+            idle += poll
+            poll = min(poll * 2, EVENT_POLL_MAX_SECONDS)
+            if idle >= EVENT_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield {"event": "ping", "data": json.dumps({"message": "keepalive"})}
+async def collect_event_logs():
+    """Periodically drop the event logs of sessions that finished a while ago."""
+    while True:
+        await asyncio.sleep(EVENT_GC_INTERVAL_SECONDS)
+        cutoff = datetime.utcnow() - timedelta(seconds=EVENT_RETENTION_SECONDS)
+        with SessionLocal() as db:
+            crud.purge_events(db, cutoff)
+REPORT_STREAM_NODES = ("write_report", "write_introduction", "write_conclusion")
+TOKEN_FLUSH_SECONDS = float(os.environ.get("TOKEN_FLUSH_SECONDS", 0.5))
+async def stream_graph(graph, graph_input, thread_config: dict, session_id: int):
+    """
+    Run the graph until it finishes or interrupts, forwarding live output:
+    custom events written by nodes (e.g. section_ready) and report_token
+    deltas for the report-writing nodes. Deltas are coalesced and written
+    together at most every TOKEN_FLUSH_SECONDS, and when a node finishes.
+    """
+    buffers: dict[str, str] = {}
+    flushed_at = time.monotonic()
+    async def flush(nodes):
+        nonlocal flushed_at
+        flushed_at = time.monotonic()
+        deltas = [(node, buffers.pop(node)) for node in list(nodes) if buffers.get(node)]
+        if deltas:
+            await push_events(
+                session_id,
+                [("report_token", {"node": node, "delta": delta}) for node, delta in deltas],
             )
-        state = await loop.run_in_executor(None, _invoke_step1)
-        analysts = state.get("analysts", [])
-        crud.save_analysts(db, session_id, analysts)
-        crud.update_session_status(db, session_id, SessionStatus.awaiting_feedback)
-        analysts_data = [
-            {
-                "name": a.name,
-                "role": a.role,
-                "affiliation": a.affiliation,
-                "description": a.description,
-            }
-            for a in analysts
-        ]
+    async for namespace, mode, chunk in graph.astream(
+        graph_input,
+        thread_config,
+        stream_mode=["messages", "custom", "updates"],
+        subgraphs=True,
+    ):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if namespace or node not in REPORT_STREAM_NODES or not message.text:
+                continue
+            buffers[node] = buffers.get(node, "") + message.text
+            if time.monotonic() - flushed_at >= TOKEN_FLUSH_SECONDS:
+                await flush(buffers)
+        elif mode == "custom":
+            await push_event(session_id, chunk["event"], chunk["data"])
+        elif not namespace:
+            await flush(chunk)
+    await flush(buffers)
+async def publish_queue_positions(positions: dict[int, int]):
+    """Tell every queued session where it currently stands in the scheduler queue."""
+    for session_id, position in positions.items():
         await push_event(
             session_id,
-            "analysts_ready",
-            {"analysts": analysts_data, "status": "awaiting_feedback"},
+            "queued",
+            {
+                "status": "queued",
+                "position": position,
+                "message": f"Waiting for a free slot (position {position} in queue).",
+            },
         )
-        feedback = None
-        for _ in range(300):  
-            await asyncio.sleep(2)
-            db.expire_all()
-            session_row = crud.get_session(db, session_id)
-            if session_row and session_row.human_analyst_feedback:
-                feedback = session_row.human_analyst_feedback
-                break
-        if feedback is None:
-            raise TimeoutError("Timed out waiting for human feedback.")
+scheduler.on_positions = publish_queue_positions
+async def run_scheduled(
+    db: Session, graph, graph_input, thread_config: dict, session_id: int, priority: int = 0
+):
+    """Run one stretch of the graph inside a scheduler slot, marking the session queued while it waits."""
+    queued = not scheduler.has_free_slot()
+    if queued:
+        crud.update_session_status(db, session_id, SessionStatus.queued)
+    async with scheduler.slot(session_id, priority):
+        if queued:
+            crud.update_session_status(db, session_id, SessionStatus.running)
+            await push_event(session_id, "status", {"message": "Agent started", "status": "running"})
+        try:
+            await stream_graph(graph, graph_input, thread_config, session_id)
+        finally:
+            crud.save_timeline_spans(db, session_id, metrics.drain_spans(session_id))
+            spent = budget.get(session_id)
+            if spent is not None:
+                crud.update_session_spend(db, session_id, spent.tokens_spent, spent.cost_spent)
+_feedback_waiters: dict[int, asyncio.Future] = {}
+FEEDBACK_TIMEOUT_SECONDS = float(os.environ.get("FEEDBACK_TIMEOUT_SECONDS", 600))
+FEEDBACK_POLL_SECONDS = float(os.environ.get("FEEDBACK_POLL_SECONDS", 15))
+def read_feedback(session_id: int) -> Optional[str]:
+    """Read the stored feedback for a session with a short-lived DB session."""
+    with SessionLocal() as db:
+        session_row = crud.get_session(db, session_id)
+        return session_row.human_analyst_feedback if session_row else None
+def notify_feedback(session_id: int, feedback: str):
+    """Wake the job waiting on this session's feedback, if it runs in this process."""
+    waiter = _feedback_waiters.get(session_id)
+    if waiter and not waiter.done():
+        waiter.set_result(feedback)
+async def wait_for_feedback(session_id: int) -> str:
+    """
+    Block until feedback is submitted for a session.
+    submit_feedback wakes the waiter directly when it runs in the same
+    process; the slow DB check covers feedback submitted to another worker.
+    No DB connection is held between checks.
+    """
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    _feedback_waiters[session_id] = waiter
+    deadline = loop.time() + FEEDBACK_TIMEOUT_SECONDS
+    try:
+        while True:
+            raise_if_cancelled(session_id)
+            feedback = read_feedback(session_id)
+            if feedback:
+                return feedback
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for human feedback.")
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(waiter), timeout=min(FEEDBACK_POLL_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                continue
+    finally:
+        _feedback_waiters.pop(session_id, None)
+async def await_feedback(
+    db: Session, session_id: int, analysts: list, pending_feedback: Optional[str] = None
+) -> str:
+    """
+    Publish the generated analysts for review and block until feedback arrives.
+    `pending_feedback` is feedback that was submitted before a restart and
+    has not been applied to the graph yet.
+    """
+    if pending_feedback:
+        crud.save_analysts(db, session_id, analysts)
+        return pending_feedback
+    crud.save_analysts(
+        db, session_id, analysts, status=SessionStatus.awaiting_feedback, clear_feedback=True
+    )
+    analysts_data = [
+        {
+            "name": a.name,
+            "role": a.role,
+            "affiliation": a.affiliation,
+            "description": a.description,
+        }
+        for a in analysts
+    ]
+    await push_event(
+        session_id,
+        "analysts_ready",
+        {"analysts": analysts_data, "status": "awaiting_feedback"},
+    )
+    db.close()
+    return await wait_for_feedback(session_id)
+REPORT_FIELDS = ("final_report", "introduction", "content", "conclusion")
+RELAYED_EVENTS = ("section_ready", "report_token")
+class Flight:
+    """A stretch of work run by one leader session that identical sessions can wait on."""
+    def __init__(self, leader_id: int):
+        self.leader_id = leader_id
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+_flights: dict[tuple, Flight] = {}
+def join_flight(key: tuple, session_id: int) -> tuple[Flight, bool]:
+    """Attach to the in-flight work for `key`, or start it. Returns (flight, is_leader)."""
+    flight = _flights.get(key)
+    if flight is not None:
+        return flight, False
+    flight = _flights[key] = Flight(session_id)
+    return flight, True
+def land_flights(led_flights: list, kind: Optional[str], result):
+    """
+    Publish `result` to followers of the flights of `kind` this session
+    leads (all of them when `kind` is None). A None result tells followers
+    to do the work themselves.
+    """
+    for entry in list(led_flights):
+        key, flight = entry
+        if kind is not None and key[0] != kind:
+            continue
+        led_flights.remove(entry)
+        if _flights.get(key) is flight:
+            del _flights[key]
+        if not flight.result.done():
+            flight.result.set_result(result)
+async def relay_events(source_id: int, target_id: int):
+    """Copy the leader's live section and report events into a follower's log."""
+    async for item in subscribe_events(source_id):
+        if item["event"] in ("report_ready", "error"):
+            return
+        if item["event"] in RELAYED_EVENTS:
+            await push_event(target_id, item["event"], json.loads(item["data"]))
+async def follow_report(flight: Flight, session_id: int) -> Optional[dict]:
+    """Wait for the leader's report, relaying its progress. None if the leader failed."""
+    await push_event(
+        session_id,
+        "status",
+        {"message": f"Sharing interviews and report with session {flight.leader_id}", "status": "running"},
+    )
+    relay = asyncio.create_task(relay_events(flight.leader_id, session_id))
+    try:
+        result = await asyncio.shield(flight.result)
+        if result:
+            await asyncio.wait_for(relay, timeout=EVENT_POLL_SECONDS * 5)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        relay.cancel()
+    if not result:
         await push_event(
             session_id,
-            "feedback_received",
-            {"feedback": feedback, "message": "Feedback received, running interviews..."},
+            "status",
+            {"message": "Shared run failed, continuing independently", "status": "running"},
         )
+    return result
+FINAL_STATUSES = (SessionStatus.completed, SessionStatus.failed, SessionStatus.cancelled)
+_agent_tasks: dict[int, asyncio.Task] = {}
+CANCEL_GRACE_SECONDS = float(os.environ.get("CANCEL_GRACE_SECONDS", 5))
+def session_cancelled(session_id: int) -> bool:
+    """Stored-status check used by cancellation to see cancels made on other workers."""
+    with SessionLocal() as db:
+        session_row = crud.get_session(db, session_id)
+        return session_row is None or session_row.status == SessionStatus.cancelled
+cancellation.status_lookup = session_cancelled
+def start_agent(session_id: int, topic: str, max_analysts: int, **options) -> asyncio.Task:
+    """Run a session's agent in the background, tracked so it can be cancelled."""
+    task = asyncio.create_task(run_agent(session_id, topic, max_analysts, **options))
+    _agent_tasks[session_id] = task
+    def finished(_):
+        _agent_tasks.pop(session_id, None)
+        scheduler.withdraw(session_id)
+    task.add_done_callback(finished)
+    return task
+async def announce_cancelled(session_id: int):
+    """Tell subscribers a session was cancelled and close its event stream."""
+    await push_event(session_id, "cancelled", {"message": "Session cancelled.", "status": "cancelled"})
+    await push_event(session_id, "end", {})
+async def stop_session(session_id: int):
+    """
+    Cancel a session's run. A run in this process is cancelled outright and
+    given CANCEL_GRACE_SECONDS to unwind; one on another worker sees the
+    stored status at its next node, LLM call or feedback check.
+    """
+    cancellation.cancel(session_id)
+    with SessionLocal() as db:
+        crud.update_session_status(db, session_id, SessionStatus.cancelled)
+    task = _agent_tasks.get(session_id)
+    if task is None:
+        await announce_cancelled(session_id)
+        return
+    task.cancel()
+    await asyncio.wait({task}, timeout=CANCEL_GRACE_SECONDS)
+async def run_agent(
+    session_id: int,
+    topic: str,
+    max_analysts: int,
+    bypass_llm_cache: bool = False,
+    priority: int = 0,
+    seed_session_id: Optional[int] = None,
+    interview_policy: Optional[dict] = None,
+):
+    """
+    Run the LangGraph research graph natively on the event loop.
+    Continues from the session's last checkpoint when one exists, so the
+    same coroutine starts new sessions and resumes interrupted ones.
+    Pushes SSE events at each key stage. With `seed_session_id`, a new run
+    starts from that session's analysts instead of generating its own.
+    Concurrent new sessions with the same topic and parameters share one
+    analyst generation, and those approving the same analysts share one
+    interview/report run (see join_flight).
+    """
+    db = SessionLocal()
+    led_flights: list = []
+    flight_id = None
+    try:
+        import main
+        graph = main.graph
+        session_row = crud.get_session(db, session_id)
+        if session_row is None:
+            return
+        pending_feedback = None
+        if session_row.status == SessionStatus.awaiting_feedback:
+            pending_feedback = session_row.human_analyst_feedback
+        run_budget = session_budget(session_row)
+        budget.track(session_id, run_budget)
         crud.update_session_status(db, session_id, SessionStatus.running)
-        def _invoke_step2():
-            return graph.invoke(
-                {"human_analyst_feedback": feedback},
+        await push_event(session_id, "status", {"message": "Agent started", "status": "running"})
+        thread_config = {
+            "configurable": {"thread_id": session_row.thread_id, "session_id": session_id}
+        }
+        snapshot = await graph.aget_state(thread_config)
+        seed_analysts = []
+        if not snapshot.values and seed_session_id is not None:
+            seed_analysts = seed_analysts_from(db, seed_session_id, max_analysts)
+        if not snapshot.values and not seed_analysts:
+            flight_key = ("analysts", normalize_query(topic), max_analysts, bypass_llm_cache)
+            flight, leading = join_flight(flight_key, session_id)
+            flight_id = flight.leader_id
+            if leading:
+                led_flights.append((flight_key, flight))
+            else:
+                await push_event(
+                    session_id,
+                    "status",
+                    {
+                        "message": f"Sharing analyst generation with session {flight.leader_id}",
+                        "status": "running",
+                    },
+                )
+                seed_analysts = await asyncio.shield(flight.result) or []
+                seed_session_id = flight.leader_id
+        if seed_analysts:
+            await graph.aupdate_state(
                 thread_config,
+                {
+                    "topic": topic,
+                    "max_analysts": max_analysts,
+                    "bypass_llm_cache": bypass_llm_cache,
+                    "interview_policy": interview_policy or {},
+                    "analysts": seed_analysts,
+                },
+                as_node="create_analysts",
             )
-        await push_event(
-            session_id,
-            "interview_progress",
-            {"message": f"Running {len(analysts)} parallel analyst interviews..."},
-        )
-        final_state = await loop.run_in_executor(None, _invoke_step2)
+            await push_event(
+                session_id,
+                "status",
+                {
+                    "message": f"Reusing {len(seed_analysts)} analysts from session {seed_session_id}",
+                    "status": "running",
+                },
+            )
+            snapshot = await graph.aget_state(thread_config)
+        elif not snapshot.values:
+            await run_scheduled(
+                db,
+                graph,
+                {
+                    "topic": topic,
+                    "max_analysts": max_analysts,
+                    "bypass_llm_cache": bypass_llm_cache,
+                    "interview_policy": interview_policy or {},
+                },
+                thread_config,
+                session_id,
+                priority,
+            )
+            snapshot = await graph.aget_state(thread_config)
+            land_flights(led_flights, "analysts", snapshot.values.get("analysts"))
+        shared_state = None
+        while snapshot.next:
+            if snapshot.next == ("human_feedback",):
+                scheduler.withdraw(session_id)
+                analysts = snapshot.values.get("analysts", [])
+                feedback = await await_feedback(db, session_id, analysts, pending_feedback)
+                pending_feedback = None
+                await push_event(
+                    session_id,
+                    "feedback_received",
+                    {"feedback": feedback, "message": "Feedback received, running interviews..."},
+                )
+                crud.update_session_status(db, session_id, SessionStatus.running)
+                await graph.aupdate_state(
+                    thread_config,
+                    {"human_analyst_feedback": feedback},
+                    as_node="human_feedback",
+                )
+                if feedback.lower() == "approve":
+                    await push_event(
+                        session_id,
+                        "interview_progress",
+                        {"message": f"Running {len(analysts)} parallel analyst interviews..."},
+                    )
+                    if flight_id is not None:
+                        flight_key = (
+                            "report",
+                            flight_id,
+                            tuple((a.name, a.role) for a in analysts),
+                            json.dumps(snapshot.values.get("interview_policy") or {}, sort_keys=True),
+                            run_budget.token_limit,
+                            run_budget.cost_limit,
+                        )
+                        flight, leading = join_flight(flight_key, session_id)
+                        if leading:
+                            led_flights.append((flight_key, flight))
+                        else:
+                            shared_state = await follow_report(flight, session_id)
+                            if shared_state:
+                                break
+            else:
+                await run_scheduled(db, graph, None, thread_config, session_id, priority)
+            snapshot = await graph.aget_state(thread_config)
+        final_state = shared_state or snapshot.values
         final_report = final_state.get("final_report", "")
         introduction = final_state.get("introduction", "")
         content = final_state.get("content", "")
@@ -188,45 +693,192 @@ async def run_agent(session_id: int, topic: str, max_analysts: int):
             introduction=introduction,
             content=content,
             conclusion=conclusion,
+            status=SessionStatus.completed,
         )
-        crud.update_session_status(db, session_id, SessionStatus.completed)
         await push_event(
             session_id,
             "report_ready",
             {"message": "Report complete!", "status": "completed"},
         )
+        land_flights(led_flights, "report", {k: final_state.get(k, "") for k in REPORT_FIELDS})
+        await push_event(session_id, "end", {})
+    except (SessionCancelled, asyncio.CancelledError):
+        if not cancellation.is_cancelled(session_id):
+            raise
+        await announce_cancelled(session_id)
     except Exception as e:
         crud.update_session_status(db, session_id, SessionStatus.failed)
         await push_event(session_id, "error", {"message": str(e), "status": "failed"})
+        await push_event(session_id, "end", {})
+    finally:
+        land_flights(led_flights, None, None)
+        cancellation.forget(session_id)
+        budget.release(session_id)
+        db.close()
+def seed_analysts_from(db: Session, session_id: int, max_analysts: int) -> list:
+    """Analyst personas of an earlier session, as graph state, for seeding a new run."""
+    return [
+        Analyst(name=a.name, role=a.role, affiliation=a.affiliation, description=a.description)
+        for a in crud.get_analysts(db, session_id)[:max_analysts]
+    ]
+# Identifies this process as the owner of the sessions it runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+SESSION_HEARTBEAT_SECONDS = float(os.environ.get("SESSION_HEARTBEAT_SECONDS", 15))
+SESSION_LEASE_SECONDS = float(os.environ.get("SESSION_LEASE_SECONDS", 60))
+def resume_interrupted_sessions():
+    """
+    Restart background runs for in-flight sessions that no live worker owns:
+    left behind by a stopped process, or by a worker whose claim has not
+    been renewed for SESSION_LEASE_SECONDS. Sessions are claimed atomically
+    first, so each is resumed by exactly one worker.
+    """
+    db = SessionLocal()
+    try:
+        sessions = crud.claim_sessions(
+            db,
+            WORKER_ID,
+            [
+                SessionStatus.pending,
+                SessionStatus.queued,
+                SessionStatus.running,
+                SessionStatus.awaiting_feedback,
+            ],
+            datetime.utcnow() - timedelta(seconds=SESSION_LEASE_SECONDS),
+        )
+        for s in sessions:
+            if s.id in _agent_tasks:
+                continue
+            options = json.loads(s.options) if s.options else {}
+            start_agent(s.id, s.topic, s.max_analysts, **options)
     finally:
         db.close()
-        q = get_or_create_queue(session_id)
-        await q.put(None)  
+async def maintain_session_claims():
+    """Renew this worker's claims on the sessions it runs and take over orphaned ones."""
+    while True:
+        await asyncio.sleep(SESSION_HEARTBEAT_SECONDS)
+        with SessionLocal() as db:
+            crud.renew_claims(db, WORKER_ID, list(_agent_tasks))
+        resume_interrupted_sessions()
 @app.post("/sessions", status_code=201)
-async def create_session(body: CreateSessionRequest, db: Session = Depends(get_db)):
-    """Create a new research session and kick off the agent in the background."""
-    if not body.topic.strip():
+async def create_session(
+    body: CreateSessionRequest, response: Response, db: Session = Depends(get_db)
+):
+    """
+    Create a new research session and kick off the agent in the background.
+    Completed sessions on a near-duplicate topic are handled per `body.reuse`.
+    """
+    topic = body.topic.strip()
+    if not topic:
         raise HTTPException(status_code=400, detail="Topic cannot be empty.")
     if body.max_analysts < 1 or body.max_analysts > 10:
         raise HTTPException(status_code=400, detail="max_analysts must be between 1 and 10.")
-    session = crud.create_session(db, topic=body.topic.strip(), max_analysts=body.max_analysts)
-    asyncio.create_task(run_agent(session.id, session.topic, session.max_analysts))
-    return session_to_dict(session)
+    if body.token_budget is not None and body.token_budget < 1:
+        raise HTTPException(status_code=400, detail="token_budget must be positive.")
+    if body.cost_budget is not None and body.cost_budget <= 0:
+        raise HTTPException(status_code=400, detail="cost_budget must be positive.")
+    similar = None
+    if body.reuse != "off":
+        candidates = crud.similar_topic_candidates(db, list(similarity.topic_terms(topic)))
+        match = similarity.best_match(topic, candidates)
+        if match:
+            similar = {"id": match[0], "topic": match[1], "similarity": round(match[2], 3)}
+    if similar and body.reuse == "return":
+        existing = crud.get_session(db, similar["id"])
+        if existing and existing.status == SessionStatus.completed:
+            response.status_code = 200
+            return {**session_to_dict(existing), "reused": True, "similar": similar}
+    try:
+        scheduler.check_admission()
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    options = {
+        "bypass_llm_cache": body.bypass_llm_cache,
+        "priority": body.priority,
+        "seed_session_id": similar["id"] if similar and body.reuse == "seed" else None,
+        "interview_policy": body.interview_policy.model_dump(),
+    }
+    session = crud.create_session(
+        db,
+        topic=topic,
+        max_analysts=body.max_analysts,
+        options=options,
+        token_budget=body.token_budget,
+        cost_budget=body.cost_budget,
+        owner=WORKER_ID,
+    )
+    scheduler.admit(session.id)
+    start_agent(session.id, session.topic, session.max_analysts, **options)
+    return {**session_to_dict(session), "reused": False, "similar": similar}
 @app.get("/sessions")
-async def list_sessions(db: Session = Depends(get_db)):
-    """Return all research sessions, newest first."""
-    sessions = crud.list_sessions(db)
-    return [session_to_dict(s) for s in sessions]
+async def list_sessions(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[list[SessionStatus]] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Return session summaries, newest first. When more sessions exist, the
+    X-Next-Cursor header holds the `cursor` value for the next page.
+    """
+    rows = crud.list_sessions(
+        db, limit=limit, before=decode_cursor(cursor) if cursor else None, statuses=status
+    )
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return [session_summary_to_dict(r) for r in rows]
+@app.get("/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """Ranked full-text search over past sessions; snippets mark matches with <mark>."""
+    rows = crud.search_sessions(db, q, limit=limit + 1, offset=offset)
+    return {
+        "query": q,
+        "hits": [
+            {
+                "id": r.id,
+                "topic": r.topic,
+                "status": r.status,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+                "snippet": r.snippet,
+                "score": -r.score,
+            }
+            for r in rows[:limit]
+        ],
+        "next_offset": offset + limit if len(rows) > limit else None,
+    }
 @app.get("/sessions/{session_id}")
-async def get_session(session_id: int, db: Session = Depends(get_db)):
-    """Get a single session with its analysts."""
+async def get_session(session_id: int, request: Request, db: Session = Depends(get_db)):
+    """Get a single session with its analysts. Supports If-None-Match."""
     session = crud.get_session(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found.")
-    return session_to_dict(session)
+    etag = make_etag(
+        "session",
+        session.id,
+        session.status.value,
+        session.updated_at,
+        session_budget(session).tokens_spent,
+    )
+    return conditional_response(
+        request, etag, REVALIDATE_CACHE_CONTROL, lambda: session_to_dict(session)
+    )
 @app.get("/sessions/{session_id}/report")
-async def get_report(session_id: int, db: Session = Depends(get_db)):
-    """Get the final report for a completed session."""
+async def get_report(session_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Get the final report for a completed session. Supports If-None-Match.
+    Reports are always revalidated rather than cached for a fixed time: a
+    database created before sqlite_autoincrement was set can still hand a
+    deleted session's ID to a new session.
+    """
     session = crud.get_session(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found.")
@@ -236,7 +888,10 @@ async def get_report(session_id: int, db: Session = Depends(get_db)):
             status_code=404,
             detail="Report not yet available. Session status: " + str(session.status),
         )
-    return report_to_dict(report)
+    etag = make_etag("report", report.session_id, session.thread_id, report.id, report.created_at)
+    return conditional_response(
+        request, etag, REVALIDATE_CACHE_CONTROL, lambda: report_to_dict(report)
+    )
 @app.post("/sessions/{session_id}/feedback")
 async def submit_feedback(
     session_id: int, body: FeedbackRequest, db: Session = Depends(get_db)
@@ -251,53 +906,173 @@ async def submit_feedback(
             detail=f"Session is not awaiting feedback (current status: {session.status}).",
         )
     crud.update_session_feedback(db, session_id, body.feedback)
+    notify_feedback(session_id, body.feedback)
     return {"message": "Feedback submitted.", "feedback": body.feedback}
 @app.get("/sessions/{session_id}/stream")
-async def stream_session(session_id: int, db: Session = Depends(get_db)):
+async def stream_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
     """
     SSE endpoint — streams live agent progress events for a session.
+    Events are replayed from the session's event log, so any number of
+    clients (on any worker) can follow a session, and a reconnect with
+    Last-Event-ID resumes right after the last event it saw.
     Event types:
       status            — general status update
+      queued            — waiting for a free slot, with queue position
       analysts_ready    — analysts generated, waiting for feedback
       feedback_received — feedback received, interviews starting
       interview_progress— interviews running
+      section_ready     — one analyst's section is written
+      analyst_dropped   — an analyst failed or missed the interview deadline (incremental mode)
+      report_token      — text delta from write_report / write_introduction / write_conclusion
       report_ready      — final report is done
+      cancelled         — the session was cancelled
       error             — something went wrong
     """
     session = crud.get_session(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found.")
-    queue = get_or_create_queue(session_id)
+    status = session.status.value if hasattr(session.status, "value") else session.status
+    finished = session.status in FINAL_STATUSES
+    resume_after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
     async def event_generator():
-        yield {
-            "event": "status",
-            "data": json.dumps(
-                {
-                    "status": session.status.value
-                    if hasattr(session.status, "value")
-                    else session.status,
-                    "message": "Connected to session stream.",
-                }
-            ),
-        }
-        while True:
-            try:
-                item = await asyncio.wait_for(queue.get(), timeout=30)
-            except asyncio.TimeoutError:
-                yield {"event": "ping", "data": json.dumps({"message": "keepalive"})}
-                continue
-            if item is None:
-                break
+        if not resume_after:
+            yield {
+                "event": "status",
+                "data": json.dumps(
+                    {
+                        "status": status,
+                        "message": "Connected to session stream.",
+                    }
+                ),
+            }
+        async for item in subscribe_events(session_id, resume_after, finished):
             yield item
     return EventSourceResponse(event_generator())
+@app.post("/sessions/{session_id}/cancel")
+async def cancel_session(session_id: int, db: Session = Depends(get_db)):
+    """Stop a session's in-flight work. Its checkpoints and partial data are kept."""
+    session = crud.get_session(db, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    if session.status in FINAL_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Session has already finished (current status: {session.status}).",
+        )
+    db.close()
+    await stop_session(session_id)
+    return {"message": "Session cancelled.", "status": SessionStatus.cancelled}
 @app.delete("/sessions/{session_id}", status_code=204)
 async def delete_session(session_id: int, db: Session = Depends(get_db)):
-    """Delete a session and all its data."""
-    deleted = crud.delete_session(db, session_id)
-    if not deleted:
+    """
+    Delete a session and all its data, including its graph checkpoints,
+    cancelling its run first if it is still going.
+    """
+    import main
+    session = crud.get_session(db, session_id)
+    if not session:
         raise HTTPException(status_code=404, detail="Session not found.")
-    _sse_queues.pop(session_id, None)
+    thread_id = session.thread_id
+    if session.status not in FINAL_STATUSES:
+        await stop_session(session_id)
+    crud.delete_session(db, session_id)
+    await main.graph.checkpointer.adelete_thread(thread_id)
+    wake_subscribers(session_id)
     return None
+@app.get("/sessions/{session_id}/timeline")
+async def get_timeline(session_id: int, db: Session = Depends(get_db)):
+    """Per-node spans for a session, including runs not yet persisted."""
+    session = crud.get_session(db, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    spans = [span_to_dict(s) for s in crud.list_timeline_spans(db, session_id)]
+    spans += [s.to_dict() for s in metrics.pending_spans(session_id)]
+    spans.sort(key=lambda s: s["started_at"])
+    return {
+        "session_id": session_id,
+        "status": session.status.value,
+        "spans": spans,
+        "totals": {
+            "duration_ms": sum(s["duration_ms"] for s in spans),
+            "llm_calls": sum(s["llm_calls"] for s in spans),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in spans),
+            "completion_tokens": sum(s["completion_tokens"] for s in spans),
+            "retrieval_ms": sum(s["retrieval_ms"] for s in spans),
+            "documents": sum(s["documents"] for s in spans),
+        },
+    }
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and sizes for the agent's caches."""
+    return {
+        "retrieval": retrieval_cache.stats(),
+        "llm": llm_response_cache.store.stats() if llm_response_cache else None,
+    }
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Slot usage and queue length of the session scheduler."""
+    return scheduler.stats()
+@app.get("/ratelimit/stats")
+async def ratelimit_stats():
+    """Per-backend rate limits, current throttle wait and retry counters."""
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Node, token and retrieval metrics plus cache, scheduler and rate-limit state, in Prometheus text format."""
+    caches = {"retrieval": retrieval_cache}
+    if llm_response_cache:
+        caches["llm"] = llm_response_cache.store
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    sched = scheduler.stats()
+    limits = {name: limiter.stats() for name, limiter in limiters.items()}
+    extra = []
+    for kind in ("hits", "misses", "evictions"):
+        extra += metrics.sample_lines(
+            f"research_cache_{kind}_total",
+            f"Cache {kind} since process start.",
+            {(name,): stats[kind] for name, stats in cache_stats.items()},
+            ("cache",),
+            "counter",
+        )
+    extra += metrics.sample_lines(
+        "research_cache_entries",
+        "Entries currently stored per cache.",
+        {(name,): stats["entries"] for name, stats in cache_stats.items()},
+        ("cache",),
+    )
+    extra += metrics.sample_lines(
+        "research_scheduler_active_sessions", "Sessions holding a slot.", {(): sched["active"]}
+    )
+    extra += metrics.sample_lines(
+        "research_scheduler_queued_sessions", "Sessions waiting for a slot.", {(): sched["queued"]}
+    )
+    extra += metrics.sample_lines(
+        "research_ratelimit_wait_seconds",
+        "How long a call issued now would be throttled.",
+        {(name,): stats["current_wait_seconds"] for name, stats in limits.items()},
+        ("backend",),
+    )
+    extra += metrics.sample_lines(
+        "research_ratelimit_throttled_calls_total",
+        "Calls delayed by the rate limiter.",
+        {(name,): stats["throttled_calls"] for name, stats in limits.items()},
+        ("backend",),
+        "counter",
+    )
+    extra += metrics.sample_lines(
+        "research_ratelimit_retries_total",
+        "Upstream calls retried after 429/5xx.",
+        {(name,): stats["retries"] for name, stats in limits.items()},
+        ("backend",),
+        "counter",
+    )
+    return PlainTextResponse(
+        metrics.render(extra), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 @app.get("/health")
 async def health():
     return {"status": "ok", "service": "Research Assistant Agent API"}
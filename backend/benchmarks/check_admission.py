@@ -0,0 +1,103 @@
+"""
+check_admission.py — Regression check for the session queue limit.
+Starts the API against the fakes with one slot and a short queue, then
+fires a burst of concurrent POST /sessions followed by sequential ones,
+and checks that only max_concurrent + max_queued sessions are admitted,
+the rest get 429 with Retry-After, and no session is told it sits past
+the end of the queue or sent the same position twice. Exits non-zero on failure.
+Usage (from backend/):
+  python benchmarks/check_admission.py --burst 10 --max-queued 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+async def post_session(client, index: int):
+    return await client.post(
+        "/sessions",
+        json={"topic": f"Admission check topic {index}", "max_analysts": 1, "reuse": "off"},
+    )
+async def queued_positions(client, session_id: int) -> list:
+    """Queue positions announced to a session up to its analysts being ready."""
+    positions = []
+    event = None
+    async with client.stream("GET", f"/sessions/{session_id}/stream") as stream:
+        async for line in stream.aiter_lines():
+            if line.startswith("event:"):
+                event = line.split(":", 1)[1].strip()
+            elif line.startswith("data:") and event == "queued":
+                positions.append(json.loads(line[5:])["position"])
+            elif line.startswith("data:") and event in ("analysts_ready", "error", "end"):
+                break
+    return positions
+def check(failures: list, ok: bool, message: str):
+    print(("ok    " if ok else "FAIL  ") + message)
+    if not ok:
+        failures.append(message)
+async def run_checks(args) -> list:
+    import httpx
+    import uvicorn
+    import api
+    from scheduler import scheduler
+    scheduler.max_concurrent = 1
+    scheduler.max_queued = args.max_queued
+    capacity = scheduler.max_concurrent + scheduler.max_queued
+    server = uvicorn.Server(
+        uvicorn.Config(api.app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    failures: list = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            burst = await asyncio.gather(*(post_session(client, i) for i in range(args.burst)))
+            accepted = [r.json()["id"] for r in burst if r.status_code == 201]
+            rejected = [r for r in burst if r.status_code == 429]
+            check(failures, len(accepted) == capacity, f"burst: {len(accepted)} of {args.burst} admitted (want {capacity})")
+            check(failures, len(rejected) == args.burst - capacity, f"burst: {len(rejected)} rejected with 429")
+            check(failures, all("Retry-After" in r.headers for r in rejected), "burst: 429s carry Retry-After")
+            stats = scheduler.stats()
+            check(failures, stats["queued"] + stats["admitted"] <= capacity, f"burst: scheduler stats {stats}")
+            for _ in range(args.sequential):
+                response = await post_session(client, args.burst)
+                check(failures, response.status_code == 429, f"sequential: POST while full got {response.status_code}")
+            announced = await asyncio.gather(*(queued_positions(client, i) for i in accepted))
+            check(
+                failures,
+                all(p <= scheduler.max_queued for positions in announced for p in positions),
+                f"positions announced {announced} stay within max_queued={scheduler.max_queued}",
+            )
+            check(
+                failures,
+                all(a != b for positions in announced for a, b in zip(positions, positions[1:])),
+                "no session is sent the same position twice in a row",
+            )
+    finally:
+        server.should_exit = True
+        await serving
+    return failures
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--sequential", type=int, default=3)
+    parser.add_argument("--max-queued", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    return parser.parse_args(argv)
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-check")
+    os.environ.setdefault("TAVILY_API_KEY", "offline-check")
+    os.chdir(tempfile.mkdtemp(prefix="research-admission-"))
+    from fakes import FakeConfig, install_fakes
+    install_fakes(FakeConfig(llm_latency=args.llm_latency))
+    failures = asyncio.run(run_checks(args))
+    return 1 if failures else 0
+if __name__ == "__main__":
+    sys.exit(main())
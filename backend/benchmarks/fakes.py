@@ -0,0 +1,164 @@
+"""
+fakes.py — Deterministic local stand-ins for Gemini, Tavily and Wikipedia.
+install_fakes() swaps them into main.py so the research graph and the API
+run offline with configurable latency and output sizes.
+"""
+import asyncio
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from schemas import Analyst, Perspectives, SearchQuery
+_WORDS = (
+    "research analysis evidence market policy model data system risk adoption "
+    "cost latency benchmark deployment regulation safety growth study result"
+).split()
+@dataclass
+class FakeConfig:
+    llm_latency: float = 0.05
+    llm_output_chars: int = 1200
+    stream_chunk_chars: int = 40
+    search_latency: float = 0.1
+    wikipedia_latency: float = 0.2
+    doc_chars: int = 3000
+    web_results: int = 3
+    wikipedia_docs: int = 2
+def filler_text(chars: int, seed: int = 0) -> str:
+    """Deterministic pseudo-prose of roughly `chars` characters."""
+    words = []
+    size = 0
+    i = seed
+    while size < chars:
+        word = _WORDS[(i * 7 + seed) % len(_WORDS)]
+        words.append(word)
+        size += len(word) + 1
+        i += 1
+    return " ".join(words)
+def _prompt_seed(messages: List[BaseMessage]) -> int:
+    return sum(len(str(m.content)) for m in messages) % 9973
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps for a fixed latency and returns filler text."""
+    config: FakeConfig
+    model: str = "fake-gemini"
+    temperature: float = 0.5
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+    def _result(self, messages: List[BaseMessage]) -> AIMessage:
+        text = filler_text(self.config.llm_output_chars, _prompt_seed(messages))
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(text) // 4
+        return AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.config.llm_latency)
+        return ChatResult(generations=[ChatGeneration(message=self._result(messages))])
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.config.llm_latency)
+        return ChatResult(generations=[ChatGeneration(message=self._result(messages))])
+    def _chunks(self, messages: List[BaseMessage]) -> Tuple[List[AIMessageChunk], float]:
+        """The streamed form of _result: chunks of stream_chunk_chars, usage on the last."""
+        message = self._result(messages)
+        text = message.content
+        step = self.config.stream_chunk_chars
+        pieces = [text[i:i + step] for i in range(0, len(text), step)] or [""]
+        chunks = [
+            AIMessageChunk(
+                content=piece,
+                usage_metadata=message.usage_metadata if i == len(pieces) - 1 else None,
+            )
+            for i, piece in enumerate(pieces)
+        ]
+        return chunks, self.config.llm_latency / len(chunks)
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        chunks, delay = self._chunks(messages)
+        for chunk in chunks:
+            time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        chunks, delay = self._chunks(messages)
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+    def with_structured_output(self, schema: Any, **kwargs: Any):
+        async def respond(messages: List[BaseMessage]):
+            if self.rate_limiter:
+                await self.rate_limiter.aacquire(blocking=True)
+            await asyncio.sleep(self.config.llm_latency)
+            return structured_response(schema, messages)
+        return RunnableLambda(respond)
+def structured_response(schema: Any, messages: List[BaseMessage]):
+    """Build a schema instance shaped like what Gemini would return for the prompt."""
+    seed = _prompt_seed(messages)
+    if schema is SearchQuery:
+        return SearchQuery(search_query=" ".join(_WORDS[seed % 10:seed % 10 + 4]))
+    if schema is Perspectives:
+        prompt = " ".join(str(m.content) for m in messages)
+        match = re.search(r"Pick the top (\d+) themes", prompt)
+        count = int(match.group(1)) if match else 3
+        return Perspectives(
+            analysts=[
+                Analyst(
+                    affiliation=f"Institute {i}",
+                    name=f"Analyst {i}",
+                    role=f"Specialist in {_WORDS[i % len(_WORDS)]}",
+                    description=filler_text(200, seed + i),
+                )
+                for i in range(count)
+            ]
+        )
+    return schema(
+        **{
+            name: filler_text(400, seed + i)
+            for i, name in enumerate(schema.model_fields)
+        }
+    )
+def install_fakes(config: Optional[FakeConfig] = None, keep_rate_limits: bool = False) -> FakeConfig:
+    """Swap the LLM and retrievers in main.py for the fakes above."""
+    import main
+    import ratelimit
+    config = config or FakeConfig()
+    async def fetch_web_docs(query: str, max_results: int = 3) -> list:
+        await asyncio.sleep(config.search_latency)
+        return [
+            {
+                "url": f"https://example.com/{zlib.crc32(f'{query}:{i}'.encode()) % 100000}",
+                "content": filler_text(config.doc_chars, len(query) + i),
+            }
+            for i in range(config.web_results)
+        ]
+    async def fetch_wikipedia_docs(query: str, load_max_docs: int = 2) -> list:
+        await asyncio.sleep(config.wikipedia_latency)
+        return [
+            {
+                "source": f"https://en.wikipedia.org/wiki/Fake_{len(query)}_{i}",
+                "page": "",
+                "content": filler_text(config.doc_chars, len(query) * 3 + i),
+            }
+            for i in range(config.wikipedia_docs)
+        ]
+    main.llm = FakeChatModel(config=config, rate_limiter=main.llm.rate_limiter)
+    main.fetch_web_docs = fetch_web_docs
+    main.fetch_wikipedia_docs = fetch_wikipedia_docs
+    if not keep_rate_limits:
+        for limiter in ratelimit.limiters.values():
+            limiter.requests = None
+            limiter.tokens = None
+    return config
@@ -0,0 +1,226 @@
+"""
+run.py — Offline benchmark for the research pipeline.
+Runs sessions against the fake LLM and retrievers from fakes.py, either by
+driving the compiled graph directly (--mode graph) or through the FastAPI
+endpoints POST /sessions, GET /stream and POST /feedback (--mode api), and
+reports throughput, end-to-end latency percentiles, per-node time and
+peak RSS.
+Usage (from backend/):
+  python benchmarks/run.py --mode graph --sessions 20 --concurrency 5
+  python benchmarks/run.py --mode api --sessions 50 --concurrency 10 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+from uuid import UUID
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+def make_node_timer():
+    """Callback handler that records wall time per LangGraph node run."""
+    from langchain_core.callbacks import AsyncCallbackHandler
+    class NodeTimer(AsyncCallbackHandler):
+        def __init__(self):
+            self.started: Dict[UUID, tuple] = {}
+            self.durations: Dict[str, List[float]] = defaultdict(list)
+        async def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+            node = (metadata or {}).get("langgraph_node")
+            if node and node == name:
+                self.started[run_id] = (node, time.perf_counter())
+        async def on_chain_end(self, outputs, *, run_id, **kwargs):
+            entry = self.started.pop(run_id, None)
+            if entry:
+                self.durations[entry[0]].append(time.perf_counter() - entry[1])
+        async def on_chain_error(self, error, *, run_id, **kwargs):
+            self.started.pop(run_id, None)
+    return NodeTimer()
+async def run_graph_session(graph, index: int, args, timer) -> float:
+    config = {
+        "configurable": {"thread_id": f"bench-{index}"},
+        "callbacks": [timer],
+    }
+    started = time.perf_counter()
+    await graph.ainvoke(
+        {"topic": f"Benchmark topic {index % args.distinct_topics}", "max_analysts": args.analysts},
+        config,
+    )
+    await graph.aupdate_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+    final_state = await graph.ainvoke(None, config)
+    if not final_state.get("final_report"):
+        raise RuntimeError(f"Session {index} finished without a report.")
+    return time.perf_counter() - started
+async def run_api_session(client, index: int, args) -> float:
+    started = time.perf_counter()
+    response = await client.post(
+        "/sessions",
+        json={
+            "topic": f"Benchmark topic {index % args.distinct_topics}",
+            "max_analysts": args.analysts,
+        },
+    )
+    response.raise_for_status()
+    session_id = response.json()["id"]
+    event = None
+    async with client.stream("GET", f"/sessions/{session_id}/stream") as stream:
+        async for line in stream.aiter_lines():
+            if line.startswith("event:"):
+                event = line.split(":", 1)[1].strip()
+            if event == "analysts_ready" and line.startswith("data:"):
+                feedback = await client.post(
+                    f"/sessions/{session_id}/feedback", json={"feedback": "approve"}
+                )
+                feedback.raise_for_status()
+            elif event == "error" and line.startswith("data:"):
+                raise RuntimeError(f"Session {session_id} failed: {line[5:].strip()}")
+            elif event == "report_ready":
+                break
+    return time.perf_counter() - started
+async def bounded(concurrency: int, jobs):
+    semaphore = asyncio.Semaphore(concurrency)
+    async def run(job):
+        async with semaphore:
+            return await job()
+    return await asyncio.gather(*(run(job) for job in jobs), return_exceptions=True)
+async def bench_graph(args) -> dict:
+    import main
+    from langgraph.checkpoint.memory import MemorySaver
+    graph = main.compile_graph(MemorySaver(serde=main.checkpoint_serde))
+    timer = make_node_timer()
+    started = time.perf_counter()
+    results = await bounded(
+        args.concurrency,
+        [lambda i=i: run_graph_session(graph, i, args, timer) for i in range(args.sessions)],
+    )
+    return {"elapsed": time.perf_counter() - started, "results": results, "nodes": timer.durations}
+async def bench_api(args) -> dict:
+    import httpx
+    import uvicorn
+    import api
+    timer = make_node_timer()
+    original_stream_graph = api.stream_graph
+    async def timed_stream_graph(graph, graph_input, thread_config, session_id):
+        thread_config = {**thread_config, "callbacks": [timer]}
+        return await original_stream_graph(graph, graph_input, thread_config, session_id)
+    api.stream_graph = timed_stream_graph
+    server = uvicorn.Server(
+        uvicorn.Config(api.app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + 10)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits
+        ) as client:
+            started = time.perf_counter()
+            results = await bounded(
+                args.concurrency,
+                [lambda i=i: run_api_session(client, i, args) for i in range(args.sessions)],
+            )
+            elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await serving
+    return {"elapsed": elapsed, "results": results, "nodes": timer.durations}
+def build_report(args, outcome: dict) -> dict:
+    latencies = [r for r in outcome["results"] if isinstance(r, float)]
+    errors = [repr(r) for r in outcome["results"] if not isinstance(r, float)]
+    return {
+        "mode": args.mode,
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "analysts": args.analysts,
+        "completed": len(latencies),
+        "failed": len(errors),
+        "errors": errors[:5],
+        "elapsed_seconds": outcome["elapsed"],
+        "sessions_per_second": len(latencies) / outcome["elapsed"] if outcome["elapsed"] else 0.0,
+        "latency_seconds": summarize(latencies),
+        "node_seconds": {node: summarize(v) for node, v in sorted(outcome["nodes"].items())},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+def print_report(report: dict):
+    lat = report["latency_seconds"]
+    print(
+        f"mode={report['mode']} sessions={report['sessions']} concurrency={report['concurrency']} "
+        f"analysts={report['analysts']}"
+    )
+    print(
+        f"completed={report['completed']} failed={report['failed']} "
+        f"elapsed={report['elapsed_seconds']:.2f}s throughput={report['sessions_per_second']:.2f} sessions/s"
+    )
+    print(f"latency p50={lat['p50']:.3f}s p95={lat['p95']:.3f}s p99={lat['p99']:.3f}s")
+    print(f"peak RSS={report['peak_rss_mb']:.1f} MiB")
+    print(f"{'node':<22}{'calls':>7}{'mean':>10}{'p95':>10}")
+    for node, stats in report["node_seconds"].items():
+        print(f"{node:<22}{stats['count']:>7}{stats['mean']:>10.3f}{stats['p95']:>10.3f}")
+    for error in report["errors"]:
+        print(f"error: {error}")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["graph", "api"], default="graph")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--analysts", type=int, default=3)
+    parser.add_argument("--distinct-topics", type=int, default=1000)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-output-chars", type=int, default=1200)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--wikipedia-latency", type=float, default=0.2)
+    parser.add_argument("--doc-chars", type=int, default=3000)
+    parser.add_argument("--keep-rate-limits", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "offline-benchmark")
+    workdir = tempfile.mkdtemp(prefix="research-bench-")
+    os.chdir(workdir)
+    from fakes import FakeConfig, install_fakes
+    install_fakes(
+        FakeConfig(
+            llm_latency=args.llm_latency,
+            llm_output_chars=args.llm_output_chars,
+            search_latency=args.search_latency,
+            wikipedia_latency=args.wikipedia_latency,
+            doc_chars=args.doc_chars,
+        ),
+        keep_rate_limits=args.keep_rate_limits,
+    )
+    runner = bench_graph if args.mode == "graph" else bench_api
+    report = build_report(args, asyncio.run(runner(args)))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if not report["failed"] else 1
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+budget.py — Per-session LLM token and cost budgets.
+invoke_llm charges every call to the session it runs for. As a session's
+budget runs down, the interview graph degrades instead of failing: it
+stops searching Wikipedia, packs smaller contexts and ends interviews
+early. Budgets are soft — no call is refused, so a session that runs out
+still writes its report.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+PROMPT_COST_PER_MTOK = float(os.environ.get("LLM_PROMPT_COST_PER_MTOK", 0.10))
+COMPLETION_COST_PER_MTOK = float(os.environ.get("LLM_COMPLETION_COST_PER_MTOK", 0.40))
+# Fractions of the budget spent at which each degradation kicks in
+BUDGET_SKIP_WIKIPEDIA_AT = float(os.environ.get("BUDGET_SKIP_WIKIPEDIA_AT", 0.5))
+BUDGET_SHRINK_CONTEXT_AT = float(os.environ.get("BUDGET_SHRINK_CONTEXT_AT", 0.7))
+BUDGET_END_INTERVIEWS_AT = float(os.environ.get("BUDGET_END_INTERVIEWS_AT", 0.85))
+def call_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost of one LLM call at the configured per-million-token prices."""
+    return (
+        prompt_tokens * PROMPT_COST_PER_MTOK + completion_tokens * COMPLETION_COST_PER_MTOK
+    ) / 1_000_000
+@dataclass
+class Budget:
+    """Limits and running spend of one session. A limit of None is unbounded."""
+    token_limit: Optional[int] = None
+    cost_limit: Optional[float] = None
+    tokens_spent: int = 0
+    cost_spent: float = 0.0
+    def charge(self, prompt_tokens: int, completion_tokens: int):
+        self.tokens_spent += prompt_tokens + completion_tokens
+        self.cost_spent += call_cost(prompt_tokens, completion_tokens)
+    @property
+    def tokens_remaining(self) -> Optional[int]:
+        if self.token_limit is None:
+            return None
+        return max(0, self.token_limit - self.tokens_spent)
+    @property
+    def cost_remaining(self) -> Optional[float]:
+        if self.cost_limit is None:
+            return None
+        return max(0.0, self.cost_limit - self.cost_spent)
+    def used_fraction(self) -> float:
+        """Share of the tighter of the two limits already spent (0.0 when unbounded)."""
+        fractions = [0.0]
+        if self.token_limit:
+            fractions.append(self.tokens_spent / self.token_limit)
+        if self.cost_limit:
+            fractions.append(self.cost_spent / self.cost_limit)
+        return max(fractions)
+_budgets: Dict[int, Budget] = {}
+def track(session_id: int, budget: Budget):
+    """Start metering a session's LLM calls against `budget`."""
+    _budgets[session_id] = budget
+def release(session_id: int) -> Optional[Budget]:
+    """Stop metering a session; returns its final budget."""
+    return _budgets.pop(session_id, None)
+def get(session_id: Optional[int]) -> Optional[Budget]:
+    return _budgets.get(session_id) if session_id is not None else None
+def charge(session_id: Optional[int], prompt_tokens: int, completion_tokens: int):
+    budget = get(session_id)
+    if budget is not None:
+        budget.charge(prompt_tokens, completion_tokens)
+def used_fraction(session_id: Optional[int]) -> float:
+    budget = get(session_id)
+    return budget.used_fraction() if budget is not None else 0.0
+def skip_wikipedia(session_id: Optional[int]) -> bool:
+    return used_fraction(session_id) >= BUDGET_SKIP_WIKIPEDIA_AT
+def context_budget(session_id: Optional[int], tokens: int) -> int:
+    """Context token budget for a prompt, halved once the session's budget runs low."""
+    return tokens // 2 if used_fraction(session_id) >= BUDGET_SHRINK_CONTEXT_AT else tokens
+def end_interviews(session_id: Optional[int]) -> bool:
+    return used_fraction(session_id) >= BUDGET_END_INTERVIEWS_AT
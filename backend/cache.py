@@ -0,0 +1,165 @@
+"""
+cache.py — SQLite-backed key/value caches shared by the agent graph.
+Entries expire after a TTL and the least recently used rows are evicted
+once a cache grows past its entry limit. Values are stored as JSON.
+Holds the retrieval cache and the opt-in LLM response cache.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Sequence
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from database import CACHE_DB_PATH
+def normalize_query(query: str) -> str:
+    """Lower-case a search query and collapse its whitespace."""
+    return " ".join(query.lower().split())
+def make_key(*parts: Any) -> str:
+    """Build a stable content hash from JSON-serialisable key parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+class SQLiteCache:
+    """A TTL + LRU cache stored in its own table of the cache database."""
+    def __init__(
+        self,
+        table: str,
+        ttl_seconds: float,
+        max_entries: int,
+        path: str = CACHE_DB_PATH,
+    ):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{self.table}_accessed_at "
+                f"ON {self.table} (accessed_at)"
+            )
+            self._conn = conn
+        return self._conn
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+            return json.loads(row[0])
+    def set(self, key: str, value: Any):
+        """Store `value` under `key`, evicting least recently used entries if full."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.evictions += max(cursor.rowcount, 0)
+    def clear(self):
+        """Drop every entry in this cache."""
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self.table}")
+    def stats(self) -> dict:
+        """Return hit/miss counters for this process and the current entry count."""
+        with self._lock:
+            entries = self._connect().execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+retrieval_cache = SQLiteCache(
+    "retrieval_cache",
+    ttl_seconds=float(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", 24 * 3600)),
+    max_entries=int(os.environ.get("RETRIEVAL_CACHE_MAX_ENTRIES", 5000)),
+)
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache that stores chat generations in an SQLiteCache.
+    Entries are keyed on the serialised model settings (model name,
+    temperature, ...) and a hash of the serialised message list.
+    """
+    def __init__(self, store: SQLiteCache):
+        self.store = store
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return make_key("llm", llm_string, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        cached = self.store.get(self._key(prompt, llm_string))
+        if cached is None:
+            return None
+        return [
+            ChatGeneration(message=message, generation_info=info)
+            for message, info in zip(
+                messages_from_dict([entry["message"] for entry in cached]),
+                [entry["generation_info"] for entry in cached],
+            )
+        ]
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]):
+        self.store.set(
+            self._key(prompt, llm_string),
+            [
+                {
+                    "message": message_to_dict(generation.message),
+                    "generation_info": generation.generation_info,
+                }
+                for generation in return_val
+            ],
+        )
+    def clear(self, **kwargs: Any):
+        self.store.clear()
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        return self.lookup(prompt, llm_string)
+    async def aupdate(self, prompt: str, llm_string: str, return_val: Sequence[Generation]):
+        self.update(prompt, llm_string, return_val)
+    async def aclear(self, **kwargs: Any):
+        self.clear()
+llm_response_cache: Optional[LLMResponseCache] = None
+if os.environ.get("LLM_CACHE_ENABLED", "").lower() in ("1", "true", "yes"):
+    llm_response_cache = LLMResponseCache(
+        SQLiteCache(
+            "llm_cache",
+            ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+            max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 2000)),
+        )
+    )
@@ -0,0 +1,46 @@
+"""
+cancellation.py — Cooperative cancellation of research sessions.
+api.py cancels a session's task directly when it runs in this process;
+graph nodes and LLM calls also check `raise_if_cancelled` so a session
+cancelled from another worker stops at its next node boundary.
+"""
+import os
+import time
+from typing import Callable, Optional
+CANCEL_POLL_SECONDS = float(os.environ.get("CANCEL_POLL_SECONDS", 2))
+class SessionCancelled(Exception):
+    """Raised inside a run whose session has been cancelled."""
+    def __init__(self, session_id: int):
+        super().__init__(f"Session {session_id} was cancelled.")
+        self.session_id = session_id
+_cancelled: set[int] = set()
+_checked_at: dict[int, float] = {}
+# Set by api.py: returns True if the stored session status is `cancelled`
+status_lookup: Optional[Callable[[int], bool]] = None
+def cancel(session_id: int):
+    """Mark a session cancelled in this process."""
+    _cancelled.add(session_id)
+def forget(session_id: int):
+    """Drop local bookkeeping once a session's run has ended."""
+    _cancelled.discard(session_id)
+    _checked_at.pop(session_id, None)
+def is_cancelled(session_id: int) -> bool:
+    """
+    True if the session was cancelled here, or (checked at most every
+    CANCEL_POLL_SECONDS per session) its stored status says so.
+    """
+    if session_id in _cancelled:
+        return True
+    if status_lookup is None:
+        return False
+    now = time.monotonic()
+    if now - _checked_at.get(session_id, 0.0) < CANCEL_POLL_SECONDS:
+        return False
+    _checked_at[session_id] = now
+    if status_lookup(session_id):
+        _cancelled.add(session_id)
+        return True
+    return False
+def raise_if_cancelled(session_id: Optional[int]):
+    if session_id is not None and is_cancelled(session_id):
+        raise SessionCancelled(session_id)
@@ -0,0 +1,126 @@
+"""
+context.py — Assembles the retrieved documents that go into a prompt.
+Documents are deduplicated by source, split into passages, ranked against
+a query with BM25 and packed under a token budget, so prompt size stays
+flat as an interview accumulates retrievals.
+"""
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
+SECTION_CONTEXT_TOKEN_BUDGET = int(os.environ.get("SECTION_CONTEXT_TOKEN_BUDGET", 6000))
+PASSAGE_WORDS = int(os.environ.get("CONTEXT_PASSAGE_WORDS", 120))
+BM25_K1 = 1.5
+BM25_B = 0.75
+_TOKEN_RE = re.compile(r"\w+")
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens used for lexical scoring."""
+    return _TOKEN_RE.findall(text.lower())
+def ngrams(text: str, n: int = 3) -> set:
+    """Set of word n-grams in `text`."""
+    tokens = tokenize(text)
+    return {tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+def ngram_novelty(text: str, prior_texts: List[str], n: int = 3) -> float:
+    """Fraction of the word n-grams in `text` that appear in none of `prior_texts` (1.0 if none yet)."""
+    grams = ngrams(text, n)
+    if not grams:
+        return 0.0
+    seen = set()
+    for prior in prior_texts:
+        seen |= ngrams(prior, n)
+    return len(grams - seen) / len(grams)
+def estimate_tokens(text: str) -> int:
+    """Cheap LLM token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+def dedupe_documents(documents: List[dict]) -> List[dict]:
+    """Keep the first document seen for each source, in retrieval order."""
+    seen = set()
+    unique = []
+    for doc in documents:
+        key = (doc["source"], doc.get("page"))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(doc)
+    return unique
+def split_passages(content: str, passage_words: int = PASSAGE_WORDS) -> List[str]:
+    """Split a document into consecutive passages of about `passage_words` words."""
+    passages = []
+    current: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", content):
+        words = paragraph.split()
+        while words:
+            room = passage_words - len(current)
+            current.extend(words[:room])
+            words = words[room:]
+            if len(current) >= passage_words:
+                passages.append(" ".join(current))
+                current = []
+    if current:
+        passages.append(" ".join(current))
+    return passages
+def bm25_scores(query: str, passages: List[str]) -> List[float]:
+    """Score each passage against the query with Okapi BM25."""
+    query_terms = set(tokenize(query))
+    tokenized = [tokenize(p) for p in passages]
+    if not query_terms or not tokenized:
+        return [0.0] * len(passages)
+    avg_len = sum(len(t) for t in tokenized) / len(tokenized) or 1.0
+    doc_freq = Counter(term for tokens in tokenized for term in set(tokens) & query_terms)
+    n = len(tokenized)
+    scores = []
+    for tokens in tokenized:
+        tf = Counter(tokens)
+        score = 0.0
+        for term in query_terms:
+            if not tf[term]:
+                continue
+            idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            norm = tf[term] + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avg_len)
+            score += idf * tf[term] * (BM25_K1 + 1) / norm
+        scores.append(score)
+    return scores
+def format_document(doc: dict, content: str) -> str:
+    """Render a document with the <Document> header the prompts cite from."""
+    if doc.get("page") is None:
+        return f'<Document href="{doc["source"]}"/>\n{content}\n</Document>'
+    return f'<Document source="{doc["source"]}" page="{doc["page"]}"/>\n{content}\n</Document>'
+def build_context(
+    documents: List[dict], query: str, token_budget: Optional[int] = None
+) -> str:
+    """
+    Return the best passages from `documents` for `query`, formatted for a
+    prompt and kept under `token_budget` estimated tokens.
+    Passages are chosen by BM25 score, then regrouped per source in their
+    original order so each document still reads top to bottom.
+    """
+    token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+    unique_docs = dedupe_documents(documents)
+    candidates = []
+    seen_passages = set()
+    for doc_index, doc in enumerate(unique_docs):
+        for passage_index, passage in enumerate(split_passages(doc["content"])):
+            if passage in seen_passages:
+                continue
+            seen_passages.add(passage)
+            candidates.append((doc_index, passage_index, passage))
+    scores = bm25_scores(query, [c[2] for c in candidates])
+    ranked = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+    selected = []
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(candidates[i][2])
+        if used + cost > token_budget:
+            continue
+        selected.append(candidates[i])
+        used += cost
+    selected.sort(key=lambda c: (c[0], c[1]))
+    by_doc: dict = {}
+    for doc_index, _, passage in selected:
+        by_doc.setdefault(doc_index, []).append(passage)
+    return "\n\n---\n\n".join(
+        format_document(unique_docs[doc_index], "\n...\n".join(passages))
+        for doc_index, passages in by_doc.items()
+    )
@@ -1,19 +1,48 @@
 """
 crud.py — CRUD helper functions for all database operations.
-All functions accept a SQLAlchemy Session and return ORM objects.
+All functions accept a SQLAlchemy Session and return ORM objects, except
+list_sessions, which returns lightweight summary rows for the history page.
 """
+import json
+import re
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from sqlalchemy import DateTime, and_, func, insert, or_, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from database import AnalystRecord, Report, ResearchSession, SessionStatus
-def create_session(db: Session, topic: str, max_analysts: int = 3) -> ResearchSession:
-    """Create and persist a new research session."""
+from database import (
+    SEARCH_INDEX_SQL,
+    SEARCH_TABLE,
+    AnalystRecord,
+    Report,
+    ResearchSession,
+    SessionEvent,
+    SessionStatus,
+    TimelineSpan,
+)
+def create_session(
+    db: Session,
+    topic: str,
+    max_analysts: int = 3,
+    options: Optional[dict] = None,
+    token_budget: Optional[int] = None,
+    cost_budget: Optional[float] = None,
+    owner: Optional[str] = None,
+) -> ResearchSession:
+    """Create and persist a new research session, claimed by `owner` if given."""
     session = ResearchSession(
         topic=topic,
         max_analysts=max_analysts,
         status=SessionStatus.pending,
+        options=json.dumps(options) if options else None,
+        token_budget=token_budget,
+        cost_budget=cost_budget,
+        owner=owner,
+        heartbeat_at=datetime.utcnow() if owner else None,
     )
     db.add(session)
+    db.flush()
+    index_session(db, session.id)
     db.commit()
     db.refresh(session)
     return session
@@ -24,68 +53,196 @@ def get_session(db: Session, session_id: int) -> Optional[ResearchSession]:
         .filter(ResearchSession.id == session_id)
         .first()
     )
-def list_sessions(db: Session, skip: int = 0, limit: int = 50) -> List[ResearchSession]:
-    """Return all sessions ordered by most recent first."""
+def list_sessions(
+    db: Session,
+    limit: int = 50,
+    before: Optional[Tuple[datetime, int]] = None,
+    statuses: Optional[List[SessionStatus]] = None,
+) -> list:
+    """
+    Return session summaries, newest first, in one query.
+    Pages are keyset-paginated: pass the (created_at, id) of the last row of
+    the previous page as `before`. Rows carry an analyst count instead of
+    the analysts themselves.
+    """
+    analyst_count = (
+        select(func.count(AnalystRecord.id))
+        .where(AnalystRecord.session_id == ResearchSession.id)
+        .correlate(ResearchSession)
+        .scalar_subquery()
+    )
+    query = db.query(
+        ResearchSession.id,
+        ResearchSession.topic,
+        ResearchSession.max_analysts,
+        ResearchSession.status,
+        ResearchSession.created_at,
+        ResearchSession.updated_at,
+        analyst_count.label("analyst_count"),
+    )
+    if statuses:
+        query = query.filter(ResearchSession.status.in_(statuses))
+    if before is not None:
+        created_at, session_id = before
+        query = query.filter(
+            or_(
+                ResearchSession.created_at < created_at,
+                and_(ResearchSession.created_at == created_at, ResearchSession.id < session_id),
+            )
+        )
     return (
-        db.query(ResearchSession)
-        .order_by(ResearchSession.created_at.desc())
-        .offset(skip)
+        query.order_by(ResearchSession.created_at.desc(), ResearchSession.id.desc())
         .limit(limit)
         .all()
     )
-def update_session_status(
-    db: Session, session_id: int, status: SessionStatus
-) -> Optional[ResearchSession]:
-    """Update the status field of a session."""
-    session = get_session(db, session_id)
-    if not session:
-        return None
-    session.status = status
-    session.updated_at = datetime.utcnow()
+def list_sessions_by_status(
+    db: Session, statuses: List[SessionStatus]
+) -> List[ResearchSession]:
+    """Return all sessions whose status is one of `statuses`, oldest first."""
+    return (
+        db.query(ResearchSession)
+        .filter(ResearchSession.status.in_(statuses))
+        .order_by(ResearchSession.created_at.asc())
+        .all()
+    )
+def claim_sessions(
+    db: Session, owner: str, statuses: List[SessionStatus], stale_before: datetime
+) -> List[ResearchSession]:
+    """
+    Atomically take over sessions in `statuses` that have no owner or whose
+    owner last renewed its claim before `stale_before`. Returns the claimed
+    sessions, oldest first; each is claimed by at most one caller.
+    """
+    claimed = db.execute(
+        update(ResearchSession)
+        .where(
+            ResearchSession.status.in_(statuses),
+            or_(
+                ResearchSession.owner.is_(None),
+                ResearchSession.heartbeat_at.is_(None),
+                ResearchSession.heartbeat_at < stale_before,
+            ),
+        )
+        .values(owner=owner, heartbeat_at=datetime.utcnow())
+        .returning(ResearchSession.id)
+    ).scalars().all()
     db.commit()
-    db.refresh(session)
-    return session
-def update_session_feedback(
-    db: Session, session_id: int, feedback: str
-) -> Optional[ResearchSession]:
-    """Store human analyst feedback on a session."""
-    session = get_session(db, session_id)
-    if not session:
-        return None
-    session.human_analyst_feedback = feedback
-    session.updated_at = datetime.utcnow()
+    if not claimed:
+        return []
+    return (
+        db.query(ResearchSession)
+        .filter(ResearchSession.id.in_(claimed))
+        .order_by(ResearchSession.created_at.asc())
+        .all()
+    )
+def renew_claims(db: Session, owner: str, session_ids: List[int]) -> int:
+    """Refresh the heartbeat of the given sessions still claimed by `owner`."""
+    if not session_ids:
+        return 0
+    result = db.execute(
+        update(ResearchSession)
+        .where(ResearchSession.id.in_(session_ids), ResearchSession.owner == owner)
+        .values(heartbeat_at=datetime.utcnow())
+    )
     db.commit()
-    db.refresh(session)
-    return session
+    return result.rowcount
+def release_claims(db: Session, owner: str) -> int:
+    """Give up every session claimed by `owner` so another worker can resume it at once."""
+    result = db.execute(
+        update(ResearchSession).where(ResearchSession.owner == owner).values(owner=None)
+    )
+    db.commit()
+    return result.rowcount
+def update_session_status(
+    db: Session, session_id: int, status: SessionStatus, commit: bool = True
+) -> bool:
+    """
+    Update the status field of a session in a single UPDATE. A cancelled
+    session keeps its status. Returns True if a row was updated.
+    """
+    result = db.execute(
+        update(ResearchSession)
+        .where(
+            ResearchSession.id == session_id,
+            ResearchSession.status != SessionStatus.cancelled,
+        )
+        .values(status=status, updated_at=datetime.utcnow())
+    )
+    if commit:
+        db.commit()
+    return result.rowcount > 0
+def update_session_spend(
+    db: Session, session_id: int, tokens_spent: int, cost_spent: float, commit: bool = True
+) -> bool:
+    """Store a session's running LLM spend. Returns True if it exists."""
+    result = db.execute(
+        update(ResearchSession)
+        .where(ResearchSession.id == session_id)
+        .values(tokens_spent=tokens_spent, cost_spent=cost_spent)
+    )
+    if commit:
+        db.commit()
+    return result.rowcount > 0
+def update_session_feedback(
+    db: Session, session_id: int, feedback: Optional[str], commit: bool = True
+) -> bool:
+    """Store (or clear, with None) human analyst feedback on a session."""
+    result = db.execute(
+        update(ResearchSession)
+        .where(ResearchSession.id == session_id)
+        .values(human_analyst_feedback=feedback, updated_at=datetime.utcnow())
+    )
+    if commit:
+        db.commit()
+    return result.rowcount > 0
 def delete_session(db: Session, session_id: int) -> bool:
     """Delete a session and all related records (cascade). Returns True if deleted."""
     session = get_session(db, session_id)
     if not session:
         return False
+    db.query(SessionEvent).filter(SessionEvent.session_id == session_id).delete()
+    db.query(TimelineSpan).filter(TimelineSpan.session_id == session_id).delete()
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {"id": session_id})
     db.delete(session)
     db.commit()
     return True
-def save_analysts(db: Session, session_id: int, analysts: list) -> List[AnalystRecord]:
+def save_analysts(
+    db: Session,
+    session_id: int,
+    analysts: list,
+    status: Optional[SessionStatus] = None,
+    clear_feedback: bool = False,
+) -> List[AnalystRecord]:
     """
     Persist a list of Analyst pydantic objects (from schemas.py) to the DB.
-    Clears any existing analysts for the session first (idempotent on re-run).
+    Replaces any existing analysts for the session (idempotent on re-run)
+    with one bulk insert, optionally updating the session's status and
+    clearing its feedback in the same transaction.
     """
     db.query(AnalystRecord).filter(AnalystRecord.session_id == session_id).delete()
-    db.commit()
     records = []
-    for analyst in analysts:
-        record = AnalystRecord(
-            session_id=session_id,
-            name=analyst.name,
-            role=analyst.role,
-            affiliation=analyst.affiliation,
-            description=analyst.description,
-        )
-        db.add(record)
-        records.append(record)
+    if analysts:
+        records = db.scalars(
+            insert(AnalystRecord).returning(AnalystRecord),
+            [
+                {
+                    "session_id": session_id,
+                    "name": analyst.name,
+                    "role": analyst.role,
+                    "affiliation": analyst.affiliation,
+                    "description": analyst.description,
+                }
+                for analyst in analysts
+            ],
+        ).all()
+    changes = {"updated_at": datetime.utcnow()}
+    if clear_feedback:
+        changes["human_analyst_feedback"] = None
+    db.execute(update(ResearchSession).where(ResearchSession.id == session_id).values(**changes))
+    if status is not None:
+        update_session_status(db, session_id, status, commit=False)
+    index_session(db, session_id)
     db.commit()
-    for r in records:
-        db.refresh(r)
     return records
 def get_analysts(db: Session, session_id: int) -> List[AnalystRecord]:
     """Return all analyst records for a session."""
@@ -101,26 +258,164 @@ def save_report(
     introduction: Optional[str] = None,
     content: Optional[str] = None,
     conclusion: Optional[str] = None,
+    status: Optional[SessionStatus] = None,
 ) -> Report:
     """
-    Create or update the report for a session.
-    Uses upsert-style logic: deletes existing report then inserts fresh.
+    Create or update the report for a session with a single upsert
+    (INSERT ... ON CONFLICT), optionally setting the session's status in
+    the same transaction.
     """
-    existing = db.query(Report).filter(Report.session_id == session_id).first()
-    if existing:
-        db.delete(existing)
-        db.commit()
-    report = Report(
-        session_id=session_id,
-        introduction=introduction,
-        content=content,
-        conclusion=conclusion,
-        final_report=final_report,
-    )
-    db.add(report)
+    values = {
+        "introduction": introduction,
+        "content": content,
+        "conclusion": conclusion,
+        "final_report": final_report,
+        "created_at": datetime.utcnow(),
+    }
+    statement = sqlite_insert(Report).values(session_id=session_id, **values)
+    report = db.scalars(
+        statement.on_conflict_do_update(index_elements=[Report.session_id], set_=values)
+        .returning(Report),
+        execution_options={"populate_existing": True},
+    ).one()
+    if status is not None:
+        update_session_status(db, session_id, status, commit=False)
+    index_session(db, session_id)
     db.commit()
-    db.refresh(report)
     return report
 def get_report(db: Session, session_id: int) -> Optional[Report]:
     """Fetch the report for a session (returns None if not yet generated)."""
     return db.query(Report).filter(Report.session_id == session_id).first()
+def index_session(db: Session, session_id: int):
+    """Refresh a session's row in the full-text search table (no commit)."""
+    db.execute(text(SEARCH_INDEX_SQL + " WHERE s.id = :id"), {"id": session_id})
+def search_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, the last one
+    as a prefix. Quoting each word keeps FTS5 operators in user input inert.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+def search_sessions(db: Session, q: str, limit: int = 20, offset: int = 0) -> list:
+    """
+    Rank sessions matching `q` across topic, report and analysts (BM25,
+    topic weighted highest) and return up to `limit` rows with a snippet
+    of the best-matching column, starting at `offset`.
+    """
+    match = search_query(q)
+    if not match:
+        return []
+    return db.execute(
+        text(
+            f"""
+            SELECT s.id, s.topic, s.status, s.created_at,
+                   snippet({SEARCH_TABLE}, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+                   bm25({SEARCH_TABLE}, 5.0, 1.0, 2.0) AS score
+            FROM {SEARCH_TABLE}
+            JOIN research_sessions s ON s.id = {SEARCH_TABLE}.rowid
+            WHERE {SEARCH_TABLE} MATCH :match
+            ORDER BY score
+            LIMIT :limit OFFSET :offset
+            """
+        ).columns(created_at=DateTime),
+        {"match": match, "limit": limit, "offset": offset},
+    ).all()
+def similar_topic_candidates(db: Session, terms: List[str], limit: int = 100) -> list:
+    """
+    Completed sessions whose topic shares any of `terms`, best BM25 match
+    first, as (id, topic) rows. Reads the shared search table, so sessions
+    completed by any worker are found.
+    """
+    if not terms:
+        return []
+    match = "topic : (" + " OR ".join(f'"{t}"' for t in terms) + ")"
+    return db.execute(
+        text(
+            f"""
+            SELECT s.id, s.topic
+            FROM {SEARCH_TABLE}
+            JOIN research_sessions s ON s.id = {SEARCH_TABLE}.rowid
+            WHERE {SEARCH_TABLE} MATCH :match AND s.status = :status
+            ORDER BY bm25({SEARCH_TABLE})
+            LIMIT :limit
+            """
+        ),
+        {"match": match, "status": SessionStatus.completed.name, "limit": limit},
+    ).all()
+def append_events(db: Session, session_id: int, events: List[tuple]) -> int:
+    """Append (event, data) pairs to a session's log in one transaction; IDs order the log."""
+    db.add_all(SessionEvent(session_id=session_id, event=event, data=data) for event, data in events)
+    db.commit()
+    return len(events)
+def list_events(
+    db: Session, session_id: int, after_id: int = 0, limit: int = 500
+) -> List[SessionEvent]:
+    """Return a session's events with an ID greater than `after_id`, in order."""
+    return (
+        db.query(SessionEvent)
+        .filter(SessionEvent.session_id == session_id, SessionEvent.id > after_id)
+        .order_by(SessionEvent.id.asc())
+        .limit(limit)
+        .all()
+    )
+def purge_events(db: Session, finished_before: datetime) -> int:
+    """
+    Delete the event logs of sessions that finished before `finished_before`,
+    and any events written for sessions that have since been deleted.
+    """
+    finished = (
+        db.query(ResearchSession.id)
+        .filter(
+            ResearchSession.status.in_(
+                [SessionStatus.completed, SessionStatus.failed, SessionStatus.cancelled]
+            ),
+            ResearchSession.updated_at < finished_before,
+        )
+        .scalar_subquery()
+    )
+    deleted = (
+        db.query(SessionEvent)
+        .filter(
+            or_(
+                SessionEvent.session_id.in_(finished),
+                SessionEvent.session_id.not_in(db.query(ResearchSession.id).scalar_subquery()),
+            )
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+def save_timeline_spans(db: Session, session_id: int, spans: list) -> int:
+    """Persist finished metrics.Span records for a session."""
+    if not spans:
+        return 0
+    db.add_all(
+        TimelineSpan(
+            session_id=session_id,
+            node=span.node,
+            analyst=span.analyst,
+            started_at=span.started_at,
+            duration_ms=span.duration_ms,
+            llm_calls=span.llm_calls,
+            prompt_tokens=span.prompt_tokens,
+            completion_tokens=span.completion_tokens,
+            retrieval_ms=span.retrieval_ms,
+            documents=span.documents,
+            error=span.error,
+        )
+        for span in spans
+    )
+    db.commit()
+    return len(spans)
+def list_timeline_spans(db: Session, session_id: int) -> List[TimelineSpan]:
+    """Return a session's recorded node runs in start order."""
+    return (
+        db.query(TimelineSpan)
+        .filter(TimelineSpan.session_id == session_id)
+        .order_by(TimelineSpan.started_at.asc(), TimelineSpan.id.asc())
+        .all()
+    )
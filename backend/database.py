@@ -1,10 +1,23 @@
 """
 database.py — SQLAlchemy models and DB engine setup.
-Uses SQLite (file: research_agent.db) for zero-config persistence.
+Uses SQLite (file: research_agent.db) for zero-config persistence, in WAL
+mode so the API and background runs can read while another connection writes.
+LangGraph checkpoints and the retrieval cache live next to it in
+research_agent_checkpoints.db and research_agent_cache.db; DATABASE_URL,
+CHECKPOINT_DB_PATH and CACHE_DB_PATH move them, and init_db carries over
+databases still at the old default paths. Topics, reports and analyst
+personas are mirrored into an FTS5 table (session_search, one row per
+session keyed by rowid = session ID) for GET /search.
 """
+import os
+import shutil
+import uuid
 from datetime import datetime
 from sqlalchemy import (
     create_engine,
+    event,
+    inspect,
+    Index,
     Column,
     Integer,
     String,
@@ -12,22 +25,47 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Enum,
+    Float,
 )
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 import enum
-DATABASE_URL = "sqlite:///./research_agent.db"
+# Where the databases lived before their paths became configurable
+LEGACY_DB_PATHS = (
+    "./research_agent.db",
+    "./research_agent_checkpoints.db",
+    "./research_agent_cache.db",
+)
+# Keep all three in one directory: WAL mode adds -wal and -shm files next to each
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///" + LEGACY_DB_PATHS[0])
+CHECKPOINT_DB_PATH = os.environ.get("CHECKPOINT_DB_PATH", LEGACY_DB_PATHS[1])
+CACHE_DB_PATH = os.environ.get("CACHE_DB_PATH", LEGACY_DB_PATHS[2])
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},  
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+    max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+    pool_pre_ping=True,
 )
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Per-connection pragmas: WAL journaling, a busy timeout instead of
+    immediate 'database is locked' errors, and fsync only at checkpoints."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 class SessionStatus(str, enum.Enum):
     pending = "pending"
+    queued = "queued"
     running = "running"
     awaiting_feedback = "awaiting_feedback"
     completed = "completed"
     failed = "failed"
+    cancelled = "cancelled"
 class ResearchSession(Base):
     """Represents one research run initiated by the user."""
     __tablename__ = "research_sessions"
@@ -38,6 +76,19 @@ class ResearchSession(Base):
         Enum(SessionStatus), default=SessionStatus.pending, nullable=False
     )
     human_analyst_feedback = Column(Text, nullable=True)
+    # JSON run options from POST /sessions (cache bypass, priority, interview policy)
+    options = Column(Text, nullable=True)
+    # LangGraph checkpoint thread. Never reused, so a new session can not
+    # pick up the checkpoints of a deleted one.
+    thread_id = Column(String(36), nullable=True, default=lambda: uuid.uuid4().hex)
+    # Worker running the session and when it last renewed that claim
+    owner = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    # LLM budget (None = unbounded) and spend so far, in tokens and USD
+    token_budget = Column(Integer, nullable=True)
+    cost_budget = Column(Float, nullable=True)
+    tokens_spent = Column(Integer, default=0)
+    cost_spent = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     analysts = relationship(
@@ -46,6 +97,11 @@ class ResearchSession(Base):
     report = relationship(
         "Report", back_populates="session", uselist=False, cascade="all, delete-orphan"
     )
+    __table_args__ = (
+        Index("ix_research_sessions_created_at_status", "created_at", "status"),
+        # Don't reuse the ID of a deleted session (only applies to newly created tables)
+        {"sqlite_autoincrement": True},
+    )
     def __repr__(self):
         return f"<ResearchSession id={self.id} topic='{self.topic}' status={self.status}>"
 class AnalystRecord(Base):
@@ -53,7 +109,10 @@ class AnalystRecord(Base):
     __tablename__ = "analysts"
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(
-        Integer, ForeignKey("research_sessions.id", ondelete="CASCADE"), nullable=False
+        Integer,
+        ForeignKey("research_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
     name = Column(String(200), nullable=False)
     role = Column(String(300), nullable=False)
@@ -80,9 +139,114 @@ class Report(Base):
     session = relationship("ResearchSession", back_populates="report")
     def __repr__(self):
         return f"<Report id={self.id} session_id={self.session_id}>"
+class SessionEvent(Base):
+    """Append-only log of the SSE events emitted for a session."""
+    __tablename__ = "session_events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(
+        Integer,
+        ForeignKey("research_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    event = Column(String(50), nullable=False)
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    def __repr__(self):
+        return f"<SessionEvent id={self.id} session_id={self.session_id} event='{self.event}'>"
+class TimelineSpan(Base):
+    """One graph node run within a session, recorded by metrics.instrument."""
+    __tablename__ = "timeline_spans"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(
+        Integer,
+        ForeignKey("research_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    node = Column(String(100), nullable=False)
+    analyst = Column(String(200), nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+    llm_calls = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    retrieval_ms = Column(Float, default=0.0)
+    documents = Column(Integer, default=0)
+    error = Column(String(100), nullable=True)
+    def __repr__(self):
+        return f"<TimelineSpan id={self.id} session_id={self.session_id} node='{self.node}'>"
+SEARCH_TABLE = "session_search"
+SEARCH_INDEX_SQL = f"""
+INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, topic, report, analysts)
+SELECT
+    s.id,
+    s.topic,
+    COALESCE(r.final_report, ''),
+    COALESCE(
+        (SELECT group_concat(a.name || ' ' || a.role || ' ' || a.description, ' ')
+         FROM analysts a WHERE a.session_id = s.id),
+        ''
+    )
+FROM research_sessions s
+LEFT JOIN reports r ON r.session_id = s.id
+"""
+def adopt_legacy_databases():
+    """
+    Move databases left at the old default paths, with their -wal and -shm
+    files, to the configured paths when those do not exist yet, so moving
+    the databases to a data directory keeps the existing history.
+    """
+    targets = (engine.url.database, CHECKPOINT_DB_PATH, CACHE_DB_PATH)
+    for legacy, target in zip(LEGACY_DB_PATHS, targets):
+        if not target or os.path.abspath(legacy) == os.path.abspath(target):
+            continue
+        if not os.path.exists(legacy) or os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        # The main file goes last: if this is interrupted it is retried next start
+        for suffix in ("-wal", "-shm", ""):
+            if os.path.exists(legacy + suffix):
+                shutil.move(legacy + suffix, target + suffix)
 def init_db():
-    """Create all tables. Call once at startup."""
+    """Move legacy databases, then create all tables and migrate existing ones. Call once at startup."""
+    adopt_legacy_databases()
     Base.metadata.create_all(bind=engine)
+    migrate_db()
+def migrate_db():
+    """
+    Bring a database created by an older version up to the current models:
+    add columns that are missing from existing tables, create any declared
+    indexes that do not exist yet, give sessions from before thread_id
+    existed their old checkpoint thread (the session ID), and create and
+    backfill the full-text search table. Every step is idempotent.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if default is not None:
+                    ddl += f" DEFAULT {default!r}" if isinstance(default, str) else f" DEFAULT {default}"
+                conn.exec_driver_sql(ddl)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        conn.exec_driver_sql(
+            "UPDATE research_sessions SET thread_id = CAST(id AS TEXT) WHERE thread_id IS NULL"
+        )
+        has_search = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+        ).first()
+        if not has_search:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                "topic, report, analysts, tokenize = 'porter unicode61')"
+            )
+            conn.exec_driver_sql(SEARCH_INDEX_SQL)
 def get_db():
     """Yield a DB session; close it after the request."""
     db = SessionLocal()
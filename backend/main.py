@@ -1,18 +1,43 @@
+import asyncio
 import os
 import operator
+import statistics
+import time
 from pydantic import BaseModel, Field
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from typing_extensions import TypedDict
 from langchain_community.document_loaders import WikipediaLoader
 from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import (
     AIMessage,
     HumanMessage,
     SystemMessage,
     get_buffer_string,
 )
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
 from langgraph.constants import Send
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, MessagesState, START, StateGraph
+import budget
+from cache import llm_response_cache, make_key, normalize_query, retrieval_cache
+from context import (
+    CONTEXT_TOKEN_BUDGET,
+    SECTION_CONTEXT_TOKEN_BUDGET,
+    build_context,
+    estimate_tokens,
+    ngram_novelty,
+)
+from cancellation import SessionCancelled, raise_if_cancelled
+from metrics import (
+    current_session_id,
+    instrument,
+    record_llm_usage,
+    record_retrieval,
+    session_id_from_config,
+)
+from ratelimit import ChatRateLimiter, Reservation, call_with_backoff
 from schemas import *
 from states import *
 from prompts import *
@@ -20,9 +45,48 @@ from langchain_google_genai import  ChatGoogleGenerativeAI
 
 llm = ChatGoogleGenerativeAI(
     model=os.environ.get("GEMINI_MODEL", "gemini-2.0-flash"),
-    temperature=0.5
+    temperature=0.5,
+    max_retries=1,
+    # Throttles after the response-cache lookup, so cached replays are not rate limited
+    rate_limiter=ChatRateLimiter("gemini"),
 )
-def create_analysts(state: GenerateAnalystsState):
+def usage_tokens(result) -> Optional[int]:
+    """Total tokens reported by a chat model response, if any"""
+    usage = getattr(result, "usage_metadata", None)
+    return usage["total_tokens"] if usage else None
+async def invoke_llm(runnable, messages: list):
+    """Invoke an LLM runnable under the shared Gemini rate limit, retrying throttled calls, and charge it to the session's budget"""
+    session_id = current_session_id()
+    raise_if_cancelled(session_id)
+    prompt = "".join(m if isinstance(m, str) else str(m.content) for m in messages)
+    estimated = estimate_tokens(prompt)
+    reservation = Reservation()
+    result = await call_with_backoff(
+        "gemini",
+        lambda: runnable.ainvoke(messages),
+        estimated_tokens=estimated,
+        actual_tokens=usage_tokens,
+        reservation=reservation,
+    )
+    if not reservation.acquired:
+        # Replayed from the response cache: nothing was sent, so nothing is spent
+        return result
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        prompt_tokens, completion_tokens = usage["input_tokens"], usage["output_tokens"]
+    else:
+        # Structured output drops usage metadata; fall back to the char-based estimate
+        prompt_tokens, completion_tokens = estimated, estimate_tokens(str(result))
+    record_llm_usage(prompt_tokens, completion_tokens)
+    budget.charge(session_id, prompt_tokens, completion_tokens)
+    return result
+def writer_llm(state) -> ChatGoogleGenerativeAI:
+    """LLM for the report-writing stages, using the response cache unless the session bypasses it"""
+    if llm_response_cache is None or state.get("bypass_llm_cache"):
+        return llm
+    return llm.model_copy(update={"cache": llm_response_cache})
+checkpoint_serde = JsonPlusSerializer(allowed_msgpack_modules=[("schemas", "Analyst")])
+async def create_analysts(state: GenerateAnalystsState):
     """Create analysts"""
     topic = state["topic"]
     max_analysts = state["max_analysts"]
@@ -33,162 +97,378 @@ def create_analysts(state: GenerateAnalystsState):
         human_analyst_feedback=human_analyst_feedback,
         max_analysts=max_analysts,
     )
-    analysts = structured_llm.invoke(
+    analysts = await invoke_llm(
+        structured_llm,
         [SystemMessage(content=system_message)]
-        + [HumanMessage(content="Generate the set of analysts.")]
+        + [HumanMessage(content="Generate the set of analysts.")],
     )
     return {"analysts": analysts.analysts}
-def human_feedback(state: GenerateAnalystsState):
+async def human_feedback(state: GenerateAnalystsState):
     """No-op node that should be interrupted on"""
     pass
-def generate_question(state: InterviewState):
+async def generate_question(state: InterviewState):
     """Node to generate a question"""
     analyst = state["analyst"]
     messages = state["messages"]
     system_message = question_instructions.format(goals=analyst.persona)
-    question = llm.invoke([SystemMessage(content=system_message)] + messages)
+    question = await invoke_llm(llm, [SystemMessage(content=system_message)] + messages)
     return {"messages": [question]}
-def search_web(state: InterviewState):
-    """Retrieve docs from web search"""
-    tavily_search = TavilySearchResults(max_results=3)
+async def plan_search(state: InterviewState):
+    """Generate the retrieval query shared by every search backend"""
     structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions] + state["messages"])
-    search_docs = tavily_search.invoke(search_query.search_query)
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-            for doc in search_docs
+    search_query = await invoke_llm(structured_llm, [search_instructions] + state["messages"])
+    return {"search_query": search_query.search_query}
+async def fetch_web_docs(query: str, max_results: int = 3) -> list:
+    """Return Tavily results for a query, served from the retrieval cache when possible"""
+    key = make_key("tavily", normalize_query(query), {"max_results": max_results})
+    search_docs = retrieval_cache.get(key)
+    if search_docs is None:
+        async def search():
+            results = await TavilySearchResults(max_results=max_results).ainvoke(query)
+            if not isinstance(results, list):
+                raise RuntimeError(f"Tavily search failed: {results}")
+            return results
+        search_docs = await call_with_backoff("tavily", search)
+        search_docs = [{"url": doc["url"], "content": doc["content"]} for doc in search_docs]
+        retrieval_cache.set(key, search_docs)
+    return search_docs
+async def fetch_wikipedia_docs(query: str, load_max_docs: int = 2) -> list:
+    """Return Wikipedia pages for a query, served from the retrieval cache when possible"""
+    key = make_key("wikipedia", normalize_query(query), {"load_max_docs": load_max_docs})
+    search_docs = retrieval_cache.get(key)
+    if search_docs is None:
+        loaded = await call_with_backoff(
+            "wikipedia",
+            lambda: WikipediaLoader(query=query, load_max_docs=load_max_docs).aload(),
+        )
+        search_docs = [
+            {
+                "source": doc.metadata["source"],
+                "page": doc.metadata.get("page", ""),
+                "content": doc.page_content,
+            }
+            for doc in loaded
         ]
-    )
-    return {"context": [formatted_search_docs]}
-def search_wikipedia(state: InterviewState):
-    """Retrieve docs from wikipedia"""
-    structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions] + state["messages"])
-    search_docs = WikipediaLoader(
-        query=search_query.search_query, load_max_docs=2
-    ).load()
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
+        retrieval_cache.set(key, search_docs)
+    return search_docs
+async def search_web(state: InterviewState):
+    """Retrieve docs from web search"""
+    started = time.perf_counter()
+    search_docs = await fetch_web_docs(state["search_query"])
+    record_retrieval("tavily", time.perf_counter() - started, len(search_docs))
+    return {
+        "documents": [
+            {"source": doc["url"], "content": doc["content"]} for doc in search_docs
         ]
-    )
-    return {"context": [formatted_search_docs]}
-def generate_answer(state: InterviewState):
+    }
+async def search_wikipedia(state: InterviewState):
+    """Retrieve docs from wikipedia, unless the session's budget is running low"""
+    if budget.skip_wikipedia(current_session_id()):
+        return {"documents": []}
+    started = time.perf_counter()
+    search_docs = await fetch_wikipedia_docs(state["search_query"])
+    record_retrieval("wikipedia", time.perf_counter() - started, len(search_docs))
+    return {"documents": search_docs}
+async def assemble_context(state: InterviewState):
+    """Rank the retrieved passages against the current question and pack the best under the token budget"""
+    question = state["messages"][-1].content
+    source_count = len({(doc["source"], doc.get("page")) for doc in state["documents"]})
+    return {
+        "context": build_context(
+            state["documents"],
+            question,
+            budget.context_budget(current_session_id(), CONTEXT_TOKEN_BUDGET),
+        ),
+        "source_count": source_count,
+        "new_sources": source_count - state.get("source_count", 0),
+    }
+async def generate_answer(state: InterviewState):
     """Node to answer a question"""
     analyst = state["analyst"]
     messages = state["messages"]
     context = state["context"]
     system_message = answer_instructions.format(goals=analyst.persona, context=context)
-    answer = llm.invoke([SystemMessage(content=system_message)] + messages)
+    answer = await invoke_llm(llm, [SystemMessage(content=system_message)] + messages)
     answer.name = "expert"
-    return {"messages": [answer]}
-def save_interview(state: InterviewState):
+    prior_answers = [
+        m.content for m in messages if isinstance(m, AIMessage) and m.name == "expert"
+    ]
+    return {
+        "messages": [answer],
+        "turns": state.get("turns", 0) + 1,
+        "novelty": ngram_novelty(answer.content, prior_answers),
+    }
+async def save_interview(state: InterviewState):
     """Save interviews"""
     messages = state["messages"]
     interview = get_buffer_string(messages)
     return {"interview": interview}
-def route_messages(state: InterviewState, name: str = "expert"):
-    """Route between question and answer"""
+def route_messages(
+    state: InterviewState, name: str = "expert", config: Optional[RunnableConfig] = None
+):
+    """
+    Route between question and answer. Ends the interview at the turn cap,
+    when the analyst signs off, when the session's budget is nearly spent,
+    or, under an adaptive policy, once the last turn brought too few new
+    sources or too little new content.
+    """
     messages = state["messages"]
-    max_num_turns = state.get("max_num_turns", 2)
-    num_responses = len(
-        [m for m in messages if isinstance(m, AIMessage) and m.name == name]
+    policy = InterviewPolicy(
+        **{"max_turns": state.get("max_num_turns", 2), **(state.get("interview_policy") or {})}
     )
-    if num_responses >= max_num_turns:
+    turns = state.get("turns", 0)
+    if turns >= policy.max_turns:
+        return "save_interview"
+    if budget.end_interviews(session_id_from_config(config)):
         return "save_interview"
     last_question = messages[-2]
     if "Thank you so much for your help" in last_question.content:
         return "save_interview"
+    if policy.adaptive and turns >= policy.min_turns:
+        if state.get("new_sources", policy.min_new_sources) < policy.min_new_sources:
+            return "save_interview"
+        if state.get("novelty", 1.0) < policy.min_novelty:
+            return "save_interview"
     return "ask_question"
-def write_section(state: InterviewState):
+async def write_section(state: InterviewState):
     """Node to write a section"""
     interview = state["interview"]
-    context = state["context"]
     analyst = state["analyst"]
+    context = build_context(
+        state["documents"],
+        f"{analyst.description}\n{interview}",
+        budget.context_budget(current_session_id(), SECTION_CONTEXT_TOKEN_BUDGET),
+    )
     system_message = section_writer_instructions.format(focus=analyst.description)
-    section = llm.invoke(
+    section = await invoke_llm(
+        writer_llm(state),
         [SystemMessage(content=system_message)]
-        + [HumanMessage(content=f"Use this source to write your section: {context}")]
+        + [HumanMessage(content=f"Use this source to write your section: {context}")],
+    )
+    get_stream_writer()(
+        {
+            "event": "section_ready",
+            "data": {
+                "analyst": analyst.name,
+                "section": section.content,
+                "message": f"Section ready: {analyst.name}",
+            },
+        }
     )
     return {"sections": [section.content]}
-interview_builder = StateGraph(InterviewState)
-interview_builder.add_node("ask_question", generate_question)
-interview_builder.add_node("search_web", search_web)
-interview_builder.add_node("search_wikipedia", search_wikipedia)
-interview_builder.add_node("answer_question", generate_answer)
-interview_builder.add_node("save_interview", save_interview)
-interview_builder.add_node("write_section", write_section)
+interview_builder = StateGraph(InterviewState, output_schema=InterviewOutputState)
+interview_builder.add_node("ask_question", instrument("ask_question", generate_question))
+interview_builder.add_node("plan_search", instrument("plan_search", plan_search))
+interview_builder.add_node("search_web", instrument("search_web", search_web))
+interview_builder.add_node("search_wikipedia", instrument("search_wikipedia", search_wikipedia))
+interview_builder.add_node("assemble_context", instrument("assemble_context", assemble_context))
+interview_builder.add_node("answer_question", instrument("answer_question", generate_answer))
+interview_builder.add_node("save_interview", instrument("save_interview", save_interview))
+interview_builder.add_node("write_section", instrument("write_section", write_section))
 interview_builder.add_edge(START, "ask_question")
-interview_builder.add_edge("ask_question", "search_web")
-interview_builder.add_edge("ask_question", "search_wikipedia")
-interview_builder.add_edge("search_web", "answer_question")
-interview_builder.add_edge("search_wikipedia", "answer_question")
+interview_builder.add_edge("ask_question", "plan_search")
+interview_builder.add_edge("plan_search", "search_web")
+interview_builder.add_edge("plan_search", "search_wikipedia")
+interview_builder.add_edge("search_web", "assemble_context")
+interview_builder.add_edge("search_wikipedia", "assemble_context")
+interview_builder.add_edge("assemble_context", "answer_question")
 interview_builder.add_conditional_edges(
     "answer_question", route_messages, ["ask_question", "save_interview"]
 )
 interview_builder.add_edge("save_interview", "write_section")
 interview_builder.add_edge("write_section", END)
+def interview_input(state: ResearchGraphState, analyst: Analyst) -> dict:
+    """Initial interview subgraph state for one analyst"""
+    return {
+        "analyst": analyst,
+        "bypass_llm_cache": state.get("bypass_llm_cache", False),
+        "interview_policy": state.get("interview_policy") or {},
+        "messages": [
+            HumanMessage(
+                content=f"So you said you were writing an article on {state['topic']}?"
+            )
+        ],
+    }
 def initiate_all_interviews(state: ResearchGraphState):
     """Conditional edge to initiate all interviews via Send() API or return to create_analysts"""
     human_analyst_feedback = state.get("human_analyst_feedback", "approve")
     if human_analyst_feedback.lower() != "approve":
         return "create_analysts"
     else:
-        topic = state["topic"]
         return [
-            Send(
-                "conduct_interview",
-                {
-                    "analyst": analyst,
-                    "messages": [
-                        HumanMessage(
-                            content=f"So you said you were writing an article on {topic}?"
-                        )
-                    ],
-                },
-            )
+            Send("conduct_interview", interview_input(state, analyst))
             for analyst in state["analysts"]
         ]
-def write_report(state: ResearchGraphState):
-    """Node to write the final report body"""
-    sections = state["sections"]
+def route_feedback(state: ResearchGraphState):
+    """Conditional edge to the incremental interview node or back to create_analysts"""
+    human_analyst_feedback = state.get("human_analyst_feedback", "approve")
+    if human_analyst_feedback.lower() != "approve":
+        return "create_analysts"
+    return "conduct_interviews"
+INTERVIEW_DEADLINE_SECONDS = float(os.environ.get("INTERVIEW_DEADLINE_SECONDS", 600))
+STRAGGLER_FACTOR = float(os.environ.get("STRAGGLER_FACTOR", 2.0))
+RECONCILE_TIMEOUT_SECONDS = float(os.environ.get("RECONCILE_TIMEOUT_SECONDS", 60))
+interview_graph = interview_builder.compile()
+def interview_deadline(finish_times: list, total: int) -> float:
+    """
+    Seconds after the start by which every interview must finish. Once half
+    of them have succeeded, stragglers get STRAGGLER_FACTOR times the median
+    successful finish time, capped by INTERVIEW_DEADLINE_SECONDS. Failed
+    interviews are left out of `finish_times`: they often fail fast and
+    would tighten the deadline for healthy ones.
+    """
+    if not finish_times or len(finish_times) * 2 < total:
+        return INTERVIEW_DEADLINE_SECONDS
+    return min(INTERVIEW_DEADLINE_SECONDS, STRAGGLER_FACTOR * statistics.median(finish_times))
+async def conduct_interviews(state: ResearchGraphState):
+    """Run all interviews concurrently, folding each section into the report draft as it arrives"""
     topic = state["topic"]
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
+    analysts = state["analysts"]
+    write_event = get_stream_writer()
+    started = time.monotonic()
+    tasks = {
+        asyncio.create_task(interview_graph.ainvoke(interview_input(state, analyst))): analyst
+        for analyst in analysts
+    }
+    pending = set(tasks)
+    finish_times, sections, errors = [], [], []
+    draft = ""
+    folding = None
+    async def fold(previous, section: str):
+        nonlocal draft
+        if previous is not None:
+            await previous
+        system_message = fold_instructions.format(topic=topic, draft=draft, section=section)
+        draft = (
+            await invoke_llm(
+                writer_llm(state),
+                [SystemMessage(content=system_message)]
+                + [HumanMessage(content=f"Merge the new memo into the draft.")],
+            )
+        ).content
+    try:
+        while pending:
+            remaining = interview_deadline(finish_times, len(tasks)) - (time.monotonic() - started)
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, remaining), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                error = task.exception()
+                if isinstance(error, SessionCancelled):
+                    raise error
+                if error is not None:
+                    errors.append(error)
+                    write_event(
+                        {
+                            "event": "analyst_dropped",
+                            "data": {
+                                "analyst": tasks[task].name,
+                                "error": str(error),
+                                "message": f"{tasks[task].name}'s interview failed; continuing without them.",
+                            },
+                        }
+                    )
+                    continue
+                finish_times.append(time.monotonic() - started)
+                for section in task.result()["sections"]:
+                    sections.append(section)
+                    folding = asyncio.create_task(fold(folding, section))
+        for task in pending:
+            task.cancel()
+            write_event(
+                {
+                    "event": "analyst_dropped",
+                    "data": {
+                        "analyst": tasks[task].name,
+                        "message": f"{tasks[task].name} missed the interview deadline; continuing without them.",
+                    },
+                }
+            )
+        if not sections:
+            raise errors[0] if errors else RuntimeError("No interview finished before the deadline.")
+        await folding
+    finally:
+        for task in [*tasks, folding]:
+            if task is not None and not task.done():
+                task.cancel()
+    if len(sections) > 1:
+        try:
+            draft = (
+                await asyncio.wait_for(
+                    invoke_llm(
+                        writer_llm(state),
+                        [SystemMessage(content=reconcile_instructions.format(topic=topic, draft=draft))]
+                        + [HumanMessage(content=f"Finalize the report body.")],
+                    ),
+                    RECONCILE_TIMEOUT_SECONDS,
+                )
+            ).content
+        except asyncio.TimeoutError:
+            pass
+    return {"sections": sections, "content": draft}
+async def join_sections(state: ResearchGraphState):
+    """Join the interview sections once for all the report-writing nodes"""
+    return {"joined_sections": "\n\n".join(f"{section}" for section in state["sections"])}
+async def write_report(state: ResearchGraphState):
+    """Node to write the final report body"""
     system_message = report_writer_instructions.format(
-        topic=topic, context=formatted_str_sections
+        topic=state["topic"], context=state["joined_sections"]
     )
-    report = llm.invoke(
+    report = await invoke_llm(
+        writer_llm(state),
         [SystemMessage(content=system_message)]
-        + [HumanMessage(content=f"Write a report based upon these memos.")]
+        + [HumanMessage(content=f"Write a report based upon these memos.")],
     )
     return {"content": report.content}
-def write_introduction(state: ResearchGraphState):
+async def write_introduction(state: ResearchGraphState):
     """Node to write the introduction"""
-    sections = state["sections"]
-    topic = state["topic"]
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
     instructions = intro_conclusion_instructions.format(
-        topic=topic, formatted_str_sections=formatted_str_sections
+        topic=state["topic"], formatted_str_sections=state["joined_sections"]
     )
-    intro = llm.invoke(
-        [instructions] + [HumanMessage(content=f"Write the report introduction")]
+    intro = await invoke_llm(
+        writer_llm(state),
+        [instructions] + [HumanMessage(content=f"Write the report introduction")],
     )
     return {"introduction": intro.content}
-def write_conclusion(state: ResearchGraphState):
+async def write_conclusion(state: ResearchGraphState):
     """Node to write the conclusion"""
-    sections = state["sections"]
-    topic = state["topic"]
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
     instructions = intro_conclusion_instructions.format(
-        topic=topic, formatted_str_sections=formatted_str_sections
+        topic=state["topic"], formatted_str_sections=state["joined_sections"]
     )
-    conclusion = llm.invoke(
-        [instructions] + [HumanMessage(content=f"Write the report conclusion")]
+    conclusion = await invoke_llm(
+        writer_llm(state),
+        [instructions] + [HumanMessage(content=f"Write the report conclusion")],
     )
     return {"conclusion": conclusion.content}
-def finalize_report(state: ResearchGraphState):
+async def write_framing(state: ResearchGraphState):
+    """Node to write the introduction and conclusion in one structured call"""
+    instructions = framing_instructions.format(
+        topic=state["topic"], formatted_str_sections=state["joined_sections"]
+    )
+    framing = await invoke_llm(
+        writer_llm(state).with_structured_output(ReportFraming),
+        [SystemMessage(content=instructions)]
+        + [HumanMessage(content=f"Write the report introduction and conclusion")],
+    )
+    return {"introduction": framing.introduction, "conclusion": framing.conclusion}
+async def write_full_report(state: ResearchGraphState):
+    """Node to write the introduction, body and conclusion in one structured call"""
+    system_message = full_report_instructions.format(
+        topic=state["topic"], context=state["joined_sections"]
+    )
+    report = await invoke_llm(
+        writer_llm(state).with_structured_output(FullReport),
+        [SystemMessage(content=system_message)]
+        + [HumanMessage(content=f"Write the report based upon these memos.")],
+    )
+    return {
+        "introduction": report.introduction,
+        "content": report.content,
+        "conclusion": report.conclusion,
+    }
+async def finalize_report(state: ResearchGraphState):
     """The is the "reduce" step where we gather all the sections, combine them, and reflect on them to write the intro/conclusion"""
     content = state["content"]
     if content.startswith("## Insights"):
@@ -210,24 +490,76 @@ def finalize_report(state: ResearchGraphState):
     if sources is not None:
         final_report += "\n\n## Sources\n" + sources
     return {"final_report": final_report}
+# How interviews run after the analysts are approved:
+#   parallel    — one Send branch per analyst; report writing waits for all of them
+#   incremental — one node folds sections into the report body as interviews finish
+#                 and proceeds without stragglers (see interview_deadline)
+INTERVIEW_MODE = os.environ.get("INTERVIEW_MODE", "parallel")
+if INTERVIEW_MODE not in ("parallel", "incremental"):
+    raise ValueError(f"INTERVIEW_MODE must be 'parallel' or 'incremental', got {INTERVIEW_MODE!r}")
+# How the report around the interview sections is written:
+#   separate — body, introduction and conclusion in three parallel calls
+#   combined — body, plus introduction and conclusion in one structured call
+#   single   — everything in one structured call
+# In incremental mode the body is already written, so only the framing is.
+# Structured calls do not stream: in combined mode the introduction and
+# conclusion (in single mode, the whole report) emit no report_token
+# events and appear only once written. separate is the default so the
+# live draft streams every part; the other modes trade that for fewer
+# calls and less repeated input.
+REPORT_WRITERS = {
+    "separate": {
+        "write_report": write_report,
+        "write_introduction": write_introduction,
+        "write_conclusion": write_conclusion,
+    },
+    "combined": {"write_report": write_report, "write_framing": write_framing},
+    "single": {"write_full_report": write_full_report},
+}
+FRAMING_WRITERS = {
+    "separate": {"write_introduction": write_introduction, "write_conclusion": write_conclusion},
+    "combined": {"write_framing": write_framing},
+    "single": {"write_framing": write_framing},
+}
+REPORT_FRAMING_MODE = os.environ.get("REPORT_FRAMING_MODE", "separate")
+if REPORT_FRAMING_MODE not in REPORT_WRITERS:
+    raise ValueError(
+        f"REPORT_FRAMING_MODE must be one of {sorted(REPORT_WRITERS)}, got {REPORT_FRAMING_MODE!r}"
+    )
+report_writers = (FRAMING_WRITERS if INTERVIEW_MODE == "incremental" else REPORT_WRITERS)[
+    REPORT_FRAMING_MODE
+]
 builder = StateGraph(ResearchGraphState)
-builder.add_node("create_analysts", create_analysts)
-builder.add_node("human_feedback", human_feedback)
-builder.add_node("conduct_interview", interview_builder.compile())
-builder.add_node("write_report", write_report)
-builder.add_node("write_introduction", write_introduction)
-builder.add_node("write_conclusion", write_conclusion)
-builder.add_node("finalize_report", finalize_report)
+builder.add_node("create_analysts", instrument("create_analysts", create_analysts))
+builder.add_node("human_feedback", instrument("human_feedback", human_feedback))
+if INTERVIEW_MODE == "incremental":
+    builder.add_node("conduct_interviews", instrument("conduct_interviews", conduct_interviews))
+else:
+    builder.add_node("conduct_interview", interview_graph)
+builder.add_node("join_sections", instrument("join_sections", join_sections))
+for name, writer in report_writers.items():
+    builder.add_node(name, instrument(name, writer))
+builder.add_node("finalize_report", instrument("finalize_report", finalize_report))
 builder.add_edge(START, "create_analysts")
 builder.add_edge("create_analysts", "human_feedback")
-builder.add_conditional_edges(
-    "human_feedback", initiate_all_interviews, ["create_analysts", "conduct_interview"]
-)
-builder.add_edge("conduct_interview", "write_report")
-builder.add_edge("conduct_interview", "write_introduction")
-builder.add_edge("conduct_interview", "write_conclusion")
-builder.add_edge(
-    ["write_conclusion", "write_report", "write_introduction"], "finalize_report"
-)
+if INTERVIEW_MODE == "incremental":
+    builder.add_conditional_edges(
+        "human_feedback", route_feedback, ["create_analysts", "conduct_interviews"]
+    )
+    builder.add_edge("conduct_interviews", "join_sections")
+else:
+    builder.add_conditional_edges(
+        "human_feedback", initiate_all_interviews, ["create_analysts", "conduct_interview"]
+    )
+    builder.add_edge("conduct_interview", "join_sections")
+for name in report_writers:
+    builder.add_edge("join_sections", name)
+builder.add_edge(list(report_writers), "finalize_report")
 builder.add_edge("finalize_report", END)
-graph = builder.compile(interrupt_before=["human_feedback"])
+def compile_graph(checkpointer=None):
+    """Compile the research graph, interrupting before human feedback"""
+    return builder.compile(
+        interrupt_before=["human_feedback"],
+        checkpointer=checkpointer or MemorySaver(serde=checkpoint_serde),
+    )
+graph = compile_graph()
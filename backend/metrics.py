@@ -0,0 +1,178 @@
+"""
+metrics.py — Per-node tracing and Prometheus-style metrics for the agent graph.
+Every graph node runs inside a span (see `instrument`) that records its wall
+time and the LLM tokens and retrievals made while it ran. Finished spans
+feed process-wide histograms/counters and are buffered per session until
+api.py persists them as the session timeline.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.runnables import RunnableConfig
+from cancellation import raise_if_cancelled
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+    def observe(self, value: float, *label_values: str):
+        series = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series: Dict[tuple, float] = {}
+    def inc(self, amount: float, *label_values: str):
+        self._series[label_values] = self._series.get(label_values, 0) + amount
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    return ",".join(f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(names, values))
+def sample_lines(
+    name: str,
+    help_text: str,
+    samples: Dict[tuple, float],
+    labels: Tuple[str, ...] = (),
+    metric_type: str = "gauge",
+) -> List[str]:
+    """Render a metric whose current values are read from elsewhere at scrape time."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for label_values, value in sorted(samples.items()):
+        label_str = _labels(labels, label_values)
+        lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return lines
+node_duration = Histogram(
+    "research_node_duration_seconds", "Wall time of graph node runs.", ("node",)
+)
+node_errors = Counter("research_node_errors_total", "Graph node runs that raised.", ("node",))
+llm_tokens = Counter(
+    "research_llm_tokens_total", "LLM tokens by node and kind (prompt/completion).", ("node", "kind")
+)
+llm_calls = Counter("research_llm_calls_total", "LLM calls by node.", ("node",))
+retrieval_duration = Histogram(
+    "research_retrieval_duration_seconds", "Latency of retrieval calls.", ("backend",)
+)
+retrieval_documents = Counter(
+    "research_retrieval_documents_total", "Documents returned by retrieval calls.", ("backend",)
+)
+@dataclass
+class Span:
+    """One node run within a session."""
+    session_id: Optional[int]
+    node: str
+    analyst: Optional[str] = None
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    duration_ms: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retrieval_ms: float = 0.0
+    documents: int = 0
+    error: Optional[str] = None
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["started_at"] = self.started_at.isoformat()
+        return data
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_pending_spans: Dict[int, List[Span]] = {}
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+def current_session_id() -> Optional[int]:
+    span = _current_span.get()
+    return span.session_id if span else None
+def session_id_from_config(config: Optional[RunnableConfig]) -> Optional[int]:
+    session_id = ((config or {}).get("configurable") or {}).get("session_id")
+    return int(session_id) if session_id is not None else None
+def instrument(name: str, fn: Callable) -> Callable:
+    """
+    Wrap an async graph node so each run is recorded as a span. Nodes of a
+    cancelled session raise SessionCancelled instead of running.
+    """
+    async def node(state, config: RunnableConfig):
+        session_id = session_id_from_config(config)
+        raise_if_cancelled(session_id)
+        analyst = state.get("analyst") if isinstance(state, dict) else None
+        span = Span(
+            session_id=session_id,
+            node=name,
+            analyst=getattr(analyst, "name", None),
+        )
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            return await fn(state)
+        except BaseException as e:
+            span.error = type(e).__name__
+            node_errors.inc(1, name)
+            raise
+        finally:
+            _current_span.reset(token)
+            elapsed = time.perf_counter() - started
+            span.duration_ms = elapsed * 1000
+            node_duration.observe(elapsed, name)
+            if span.session_id is not None:
+                _pending_spans.setdefault(span.session_id, []).append(span)
+    node.__name__ = fn.__name__
+    node.__doc__ = fn.__doc__
+    return node
+def record_llm_usage(prompt_tokens: int, completion_tokens: int):
+    """Attribute one LLM call's token usage to the running node."""
+    span = current_span()
+    node = span.node if span else "unknown"
+    llm_calls.inc(1, node)
+    llm_tokens.inc(prompt_tokens, node, "prompt")
+    llm_tokens.inc(completion_tokens, node, "completion")
+    if span:
+        span.llm_calls += 1
+        span.prompt_tokens += prompt_tokens
+        span.completion_tokens += completion_tokens
+def record_retrieval(backend: str, seconds: float, documents: int):
+    """Attribute one retrieval call to the running node."""
+    retrieval_duration.observe(seconds, backend)
+    retrieval_documents.inc(documents, backend)
+    span = current_span()
+    if span:
+        span.retrieval_ms += seconds * 1000
+        span.documents += documents
+def drain_spans(session_id: int) -> List[Span]:
+    """Remove and return the spans buffered for a session."""
+    return _pending_spans.pop(session_id, [])
+def pending_spans(session_id: int) -> List[Span]:
+    """Spans recorded for a session that have not been persisted yet."""
+    return list(_pending_spans.get(session_id, []))
+def render(extra_lines: List[str] = ()) -> str:
+    """Prometheus text exposition of all registered metrics."""
+    lines: List[str] = []
+    for metric in (node_duration, node_errors, llm_calls, llm_tokens, retrieval_duration, retrieval_documents):
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
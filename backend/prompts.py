@@ -110,3 +110,62 @@ For your introduction, create a compelling title and use the # header for the ti
 For your introduction, use ## Introduction as the section header. 
 For your conclusion, use ## Conclusion as the section header.
 Here are the sections to reflect on for writing: {formatted_str_sections}"""
+framing_instructions = """You are a technical writer finishing a report on {topic}
+You will be given all of the sections of the report.
+You job is to write both a crisp and compelling introduction and a crisp and compelling conclusion.
+Include no pre-amble for either section.
+Target around 100 words each, crisply previewing (for the introduction) and recapping (for the conclusion) all of the sections of the report.
+Use markdown formatting. 
+For your introduction, create a compelling title and use the # header for the title.
+For your introduction, use ## Introduction as the section header. 
+For your conclusion, use ## Conclusion as the section header.
+Here are the sections to reflect on for writing: {formatted_str_sections}"""
+full_report_instructions = """You are a technical writer creating a report on this overall topic: 
+{topic}
+You have a team of analysts. Each analyst has done two things: 
+1. They conducted an interview with an expert on a specific sub-topic.
+2. They write up their finding into a memo.
+Your task: 
+1. You will be given a collection of memos from your analysts.
+2. Think carefully about the insights from each memo.
+3. Write the three parts of the report: an introduction, the report body and a conclusion.
+For the report body:
+1. Consolidate the memos into a crisp overall summary that ties together their central ideas as a cohesive single narrative.
+2. Use markdown formatting, no pre-amble and no sub-heading. 
+3. Start the body with a single title header: ## Insights
+4. Do not mention any analyst names.
+5. Preserve any citations in the memos, which will be annotated in brackets, for example [1] or [2].
+6. Create a final, consolidated list of sources and add to a Sources section with the `## Sources` header.
+7. List your sources in order and do not repeat.
+[1] Source 1
+[2] Source 2
+For the introduction and conclusion:
+1. Target around 100 words each, crisply previewing (for the introduction) or recapping (for the conclusion) the report.
+2. For your introduction, create a compelling title and use the # header for the title, then use ## Introduction as the section header. 
+3. For your conclusion, use ## Conclusion as the section header.
+4. Include no pre-amble for either section.
+Here are the memos from your analysts to build your report from: 
+{context}"""
+fold_instructions = """You are a technical writer building a report on this overall topic: 
+{topic}
+Your analysts are finishing their memos one at a time, and you keep a running draft of the report body.
+Your task: merge the new memo into the current draft.
+1. Keep every insight already in the draft and weave in the central points of the new memo as a cohesive single narrative.
+2. Use markdown formatting, no pre-amble and no sub-heading. 
+3. Start the draft with a single title header: ## Insights
+4. Do not mention any analyst names.
+5. Preserve citations, annotated in brackets, for example [1] or [2], renumbering the new memo's sources so they continue the draft's numbering.
+6. End with a consolidated `## Sources` section listing every source in order without repeats.
+Current draft (empty if this is the first memo): 
+{draft}
+New memo: 
+{section}"""
+reconcile_instructions = """You are a technical editor finalizing the body of a report on this overall topic: 
+{topic}
+The draft below was assembled incrementally from several memos.
+Your task: make a light final pass.
+1. Remove repetition and smooth transitions, keeping every insight.
+2. Make sure citations, annotated in brackets, for example [1] or [2], are numbered in order of first use and match a single `## Sources` section without repeats.
+3. Keep the single ## Insights title header, no pre-amble and no sub-heading.
+Draft: 
+{draft}"""
@@ -0,0 +1,190 @@
+"""
+ratelimit.py — Process-wide rate limiting and retry/backoff for upstream APIs.
+Each backend (gemini, tavily, wikipedia) has a requests/min bucket and an
+optional tokens/min bucket shared by every session in the process. Calls
+that fail with 429/5xx are retried with jittered exponential backoff.
+Chat models acquire their limit through a ChatRateLimiter hook, which
+LangChain calls after the response-cache lookup, so cache hits are free.
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+from langchain_core.rate_limiters import BaseRateLimiter
+T = TypeVar("T")
+MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", 5))
+BACKOFF_BASE_SECONDS = float(os.environ.get("UPSTREAM_BACKOFF_BASE_SECONDS", 1.0))
+BACKOFF_MAX_SECONDS = float(os.environ.get("UPSTREAM_BACKOFF_MAX_SECONDS", 60.0))
+_RETRYABLE_RE = re.compile(
+    r"\b(429|5\d\d)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|rate limit|quota", re.IGNORECASE
+)
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute of burst."""
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    def take(self, amount: float) -> float:
+        """Reserve `amount` units and return how long the caller must wait for them."""
+        self._refill()
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+    def refund(self, amount: float):
+        """Return (or, if negative, charge) units after the real cost is known."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+    def wait_seconds(self) -> float:
+        self._refill()
+        return max(0.0, -self.level / self.rate)
+class BackendLimiter:
+    """Request and token buckets for one upstream backend, plus throttle counters."""
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float = 0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.waiting = 0
+        self.throttled_calls = 0
+        self.total_wait_seconds = 0.0
+        self.retries = 0
+        self.failures = 0
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve one request (and `tokens` tokens); returns how long to wait before sending."""
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.take(1))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.take(tokens))
+        if delay > 0:
+            self.throttled_calls += 1
+            self.total_wait_seconds += delay
+        return delay
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request (and `tokens` tokens) fit under the limits."""
+        delay = self.reserve(tokens)
+        if delay <= 0:
+            return
+        self.waiting += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+    def settle_tokens(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a call is known."""
+        if self.tokens is not None:
+            self.tokens.refund(estimated - actual)
+    def current_wait_seconds(self) -> float:
+        """How long a call issued now would wait before being sent."""
+        waits = [b.wait_seconds() for b in (self.requests, self.tokens) if b is not None]
+        return max(waits, default=0.0)
+    def stats(self) -> dict:
+        return {
+            "requests_per_minute": self.requests.capacity if self.requests else None,
+            "tokens_per_minute": self.tokens.capacity if self.tokens else None,
+            "current_wait_seconds": round(self.current_wait_seconds(), 3),
+            "waiting": self.waiting,
+            "throttled_calls": self.throttled_calls,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+limiters = {
+    "gemini": BackendLimiter(
+        "gemini",
+        float(os.environ.get("GEMINI_RPM", 60)),
+        float(os.environ.get("GEMINI_TPM", 1_000_000)),
+    ),
+    "tavily": BackendLimiter("tavily", float(os.environ.get("TAVILY_RPM", 100))),
+    "wikipedia": BackendLimiter("wikipedia", float(os.environ.get("WIKIPEDIA_RPM", 200))),
+}
+@dataclass
+class Reservation:
+    """Tokens a chat model call reserves if (and when) its ChatRateLimiter hook fires."""
+    tokens: int = 0
+    acquired: bool = False
+_reservation: ContextVar[Optional[Reservation]] = ContextVar("rate_limit_reservation", default=None)
+class ChatRateLimiter(BaseRateLimiter):
+    """
+    LangChain `rate_limiter` hook backed by a backend's limiter. The tokens
+    reserved come from the Reservation of the enclosing call_with_backoff.
+    """
+    def __init__(self, backend: str):
+        self.limiter = limiters[backend]
+    def _tokens(self) -> int:
+        reservation = _reservation.get()
+        if reservation is None:
+            return 0
+        reservation.acquired = True
+        return reservation.tokens
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not blocking and self.limiter.current_wait_seconds() > 0:
+            return False
+        time.sleep(self.limiter.reserve(self._tokens()))
+        return True
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking and self.limiter.current_wait_seconds() > 0:
+            return False
+        await self.limiter.acquire(self._tokens())
+        return True
+def is_retryable(exc: Exception) -> bool:
+    """True for throttling (429) and server-side (5xx) failures."""
+    for attr in ("code", "status_code", "status"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code == 429 or 500 <= code < 600
+    response = getattr(exc, "response", None)
+    code = getattr(response, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or 500 <= code < 600
+    return bool(_RETRYABLE_RE.search(str(exc)))
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+async def call_with_backoff(
+    backend: str,
+    call: Callable[[], Awaitable[T]],
+    estimated_tokens: int = 0,
+    actual_tokens: Optional[Callable[[T], Optional[int]]] = None,
+    reservation: Optional[Reservation] = None,
+) -> T:
+    """
+    Run `call` under the backend's rate limit, retrying 429/5xx failures.
+    `actual_tokens` extracts the real usage from the result so the token
+    bucket is charged for what the call actually cost. With a
+    `reservation`, `call` acquires the limit itself through a
+    ChatRateLimiter hook; if it never does (a cache hit) nothing is charged.
+    """
+    limiter = limiters[backend]
+    token = _reservation.set(reservation) if reservation is not None else None
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            if reservation is None:
+                await limiter.acquire(estimated_tokens)
+            else:
+                reservation.tokens = estimated_tokens
+                reservation.acquired = False
+            try:
+                result = await call()
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    limiter.failures += 1
+                    raise
+                limiter.retries += 1
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if actual_tokens is not None and (reservation is None or reservation.acquired):
+                used = actual_tokens(result)
+                if used is not None:
+                    limiter.settle_tokens(estimated_tokens, used)
+            return result
+    finally:
+        if token is not None:
+            _reservation.reset(token)
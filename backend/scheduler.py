@@ -0,0 +1,125 @@
+"""
+scheduler.py — Admission control for research sessions.
+A session holds one of `max_concurrent` slots while its graph is running
+(the wait for human feedback does not hold a slot). Sessions waiting for
+a slot sit in a priority queue, FIFO within a priority; once `max_queued`
+sessions are waiting, new sessions are rejected with a retry hint. A
+session counts against the queue from the moment it is admitted, so a
+burst of requests can not all slip in before their runs reach acquire().
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+class QueueFullError(Exception):
+    """Raised when the session queue is full; `retry_after` is in seconds."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Session queue is full, retry in {retry_after}s.")
+        self.retry_after = retry_after
+class SessionScheduler:
+    """Bounded slot pool with a priority wait queue (lower priority value runs first)."""
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.on_positions: Optional[Callable[[dict], Awaitable[None]]] = None
+        self._active: set[int] = set()
+        # Admitted sessions that have not asked for a slot yet
+        self._admitted: set[int] = set()
+        self._queue: list = []
+        self._published: dict[int, int] = {}
+        self._counter = itertools.count()
+        self._avg_hold_seconds = 60.0
+    def _waiting(self) -> list:
+        return sorted(entry for entry in self._queue if not entry[3].done())
+    def has_free_slot(self) -> bool:
+        return len(self._active) < self.max_concurrent and not self._waiting()
+    def positions(self) -> dict[int, int]:
+        """1-based queue position of every waiting session."""
+        return {entry[2]: i + 1 for i, entry in enumerate(self._waiting())}
+    def _backlog(self) -> int:
+        """Sessions that would be waiting if every admitted session asked for a slot now."""
+        free = max(0, self.max_concurrent - len(self._active))
+        return max(0, len(self._waiting()) + len(self._admitted) - free)
+    def retry_after(self) -> int:
+        """Rough seconds until a queue spot frees up, from the average slot hold time."""
+        waves = (self._backlog() + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_hold_seconds * waves))
+    def check_admission(self):
+        """Raise QueueFullError if a new session could not even be queued."""
+        if self._backlog() >= self.max_queued:
+            raise QueueFullError(self.retry_after())
+    def admit(self, session_id: int):
+        """
+        Reserve a queue spot for a session that passed check_admission. Call
+        it before the next await so no other request is admitted in between.
+        """
+        self._admitted.add(session_id)
+    def withdraw(self, session_id: int):
+        """Drop the reservation of a session that will not ask for a slot (yet)."""
+        self._admitted.discard(session_id)
+    def _publish_positions(self):
+        """Send the positions that changed since the last publish."""
+        positions = self.positions()
+        changed = {
+            session_id: position
+            for session_id, position in positions.items()
+            if self._published.get(session_id) != position
+        }
+        self._published = positions
+        if changed and self.on_positions is not None:
+            asyncio.ensure_future(self.on_positions(changed))
+    async def acquire(self, session_id: int, priority: int = 0):
+        """Wait for a free slot for `session_id`."""
+        self._admitted.discard(session_id)
+        if self.has_free_slot():
+            self._active.add(session_id)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), session_id, waiter))
+        self._publish_positions()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(session_id)
+            else:
+                self._publish_positions()
+            raise
+    def release(self, session_id: int):
+        """Free the slot held by `session_id` and hand it to the next waiter."""
+        self._active.discard(session_id)
+        while self._queue and len(self._active) < self.max_concurrent:
+            _, _, next_id, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                continue
+            self._active.add(next_id)
+            waiter.set_result(None)
+        self._publish_positions()
+    @asynccontextmanager
+    async def slot(self, session_id: int, priority: int = 0):
+        """Hold a slot for the duration of the block."""
+        await self.acquire(session_id, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            self._avg_hold_seconds = 0.8 * self._avg_hold_seconds + 0.2 * held
+            self.release(session_id)
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": len(self._active),
+            "queued": len(self._waiting()),
+            "admitted": len(self._admitted),
+            "avg_hold_seconds": round(self._avg_hold_seconds, 2),
+        }
+scheduler = SessionScheduler(
+    max_concurrent=int(os.environ.get("MAX_CONCURRENT_SESSIONS", 4)),
+    max_queued=int(os.environ.get("MAX_QUEUED_SESSIONS", 100)),
+)
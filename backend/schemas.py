@@ -20,3 +20,30 @@ class Perspectives(BaseModel):
     )
 class SearchQuery(BaseModel):
     search_query: str = Field(None, description="Search query for retrieval.")
+class ReportFraming(BaseModel):
+    introduction: str = Field(
+        description="Report introduction: a # title, then a ## Introduction section.",
+    )
+    conclusion: str = Field(
+        description="Report conclusion under a ## Conclusion header.",
+    )
+class FullReport(BaseModel):
+    introduction: str = Field(
+        description="Report introduction: a # title, then a ## Introduction section.",
+    )
+    content: str = Field(
+        description="Report body starting with ## Insights and ending with a ## Sources section.",
+    )
+    conclusion: str = Field(
+        description="Report conclusion under a ## Conclusion header.",
+    )
+class InterviewPolicy(BaseModel):
+    max_turns: int = Field(2, ge=1, le=10, description="Hard cap on expert answers per interview.")
+    adaptive: bool = Field(True, description="Stop early once an interview is saturated.")
+    min_turns: int = Field(1, ge=1, description="Answers before adaptive stopping may apply.")
+    min_new_sources: int = Field(
+        1, ge=0, description="Stop when the last retrieval added fewer new sources than this.",
+    )
+    min_novelty: float = Field(
+        0.2, ge=0, le=1, description="Stop when fewer than this fraction of the last answer's word 3-grams are new.",
+    )
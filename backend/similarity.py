@@ -0,0 +1,52 @@
+"""
+similarity.py — TF-IDF scoring of near-duplicate research topics.
+POST /sessions fetches candidate completed sessions from the shared search
+table (crud.similar_topic_candidates), so it sees sessions finished by any
+worker, and scores them here. The best match can be returned as-is or used
+to seed a new run's analysts.
+"""
+import math
+import os
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+from context import tokenize
+TOPIC_SIMILARITY_THRESHOLD = float(os.environ.get("TOPIC_SIMILARITY_THRESHOLD", 0.75))
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how in into is it of on or the this to vs what "
+    "when where which who why will with about over under between".split()
+)
+def topic_terms(topic: str) -> Counter:
+    """Term counts of a topic, without stopwords."""
+    return Counter(t for t in tokenize(topic) if t not in STOPWORDS)
+def best_match(
+    topic: str,
+    candidates: Iterable[Tuple[int, str]],
+    threshold: float = TOPIC_SIMILARITY_THRESHOLD,
+) -> Optional[Tuple[int, str, float]]:
+    """
+    The (session_id, topic, cosine similarity) of the candidate most like
+    `topic`, if it scores at least `threshold`. Terms are weighted by
+    TF-IDF, with document frequencies counted over the candidates.
+    """
+    docs = [(session_id, text, topic_terms(text)) for session_id, text in candidates]
+    docs = [doc for doc in docs if doc[2]]
+    document_frequency = Counter(term for _, _, terms in docs for term in terms)
+    def vector(terms: Counter) -> Dict[str, float]:
+        return {
+            t: c * (math.log((len(docs) + 1) / (document_frequency[t] + 1)) + 1)
+            for t, c in terms.items()
+        }
+    query = vector(topic_terms(topic))
+    query_norm = math.sqrt(sum(w * w for w in query.values()))
+    if not query_norm:
+        return None
+    best = None
+    for session_id, text, terms in docs:
+        doc = vector(terms)
+        doc_norm = math.sqrt(sum(w * w for w in doc.values()))
+        score = sum(w * doc.get(t, 0.0) for t, w in query.items()) / (query_norm * doc_norm)
+        if best is None or score > best[2]:
+            best = (session_id, text, score)
+    if best and best[2] >= threshold:
+        return best
+    return None
@@ -9,17 +9,30 @@ class GenerateAnalystsState(TypedDict):
     analysts: List[Analyst]  
 class InterviewState(MessagesState):
     max_num_turns: int  
-    context: Annotated[list, operator.add]  
+    documents: Annotated[list, operator.add]  
+    context: str  
+    search_query: str  
     analyst: Analyst  
     interview: str  
     sections: list  
+    bypass_llm_cache: bool  
+    interview_policy: dict
+    turns: int
+    novelty: float
+    source_count: int
+    new_sources: int
+class InterviewOutputState(TypedDict):
+    sections: list  
 class ResearchGraphState(TypedDict):
     topic: str  
     max_analysts: int  
     human_analyst_feedback: str  
     analysts: List[Analyst]  
     sections: Annotated[list, operator.add]  
+    joined_sections: str
     introduction: str  
     content: str  
     conclusion: str  
     final_report: str  
+    bypass_llm_cache: bool
+    interview_policy: dict  
@@ -13,6 +13,7 @@ function App() {
   const [report, setReport] = useState(null)
   const [events, setEvents] = useState([])
   const [feedback, setFeedback] = useState('')
+  const [draft, setDraft] = useState({})
   useEffect(() => {
     fetch('/sessions')
       .then(res => res.json())
@@ -24,8 +25,10 @@ function App() {
       setActiveSession(null)
       setReport(null)
       setEvents([])
+      setDraft({})
       return
     }
+    setDraft({})
     fetch(`/sessions/${activeSessionId}`)
       .then(res => res.json())
       .then(data => {
@@ -48,6 +51,10 @@ function App() {
     eventSource.addEventListener('status', (e) => {
       setEvents(prev => [...prev, { event: 'status', data: e.data }])
     })
+    eventSource.addEventListener('queued', (e) => {
+      setEvents(prev => [...prev, { event: 'queued', data: e.data }])
+      setActiveSession(prev => prev && { ...prev, status: 'queued' })
+    })
     eventSource.addEventListener('analysts_ready', (e) => {
       setEvents(prev => [...prev, { event: 'analysts_ready', data: e.data }])
       fetch(`/sessions/${activeSessionId}`)
@@ -60,6 +67,16 @@ function App() {
     eventSource.addEventListener('interview_progress', (e) => {
       setEvents(prev => [...prev, { event: 'interview_progress', data: e.data }])
     })
+    eventSource.addEventListener('section_ready', (e) => {
+      setEvents(prev => [...prev, { event: 'section_ready', data: e.data }])
+    })
+    eventSource.addEventListener('analyst_dropped', (e) => {
+      setEvents(prev => [...prev, { event: 'analyst_dropped', data: e.data }])
+    })
+    eventSource.addEventListener('report_token', (e) => {
+      const { node, delta } = JSON.parse(e.data)
+      setDraft(prev => ({ ...prev, [node]: (prev[node] || '') + delta }))
+    })
     eventSource.addEventListener('report_ready', (e) => {
       setEvents(prev => [...prev, { event: 'report_ready', data: e.data }])
       fetch(`/sessions/${activeSessionId}/report`)
@@ -72,6 +89,12 @@ function App() {
           setSessions(prev => prev.map(s => s.id === data.id ? data : s))
         })
     })
+    eventSource.addEventListener('cancelled', (e) => {
+      setEvents(prev => [...prev, { event: 'cancelled', data: e.data }])
+      setActiveSession(prev => prev && { ...prev, status: 'cancelled' })
+      setSessions(prev => prev.map(s => s.id === activeSessionId ? { ...s, status: 'cancelled' } : s))
+      eventSource.close()
+    })
     eventSource.addEventListener('error', (e) => {
       setEvents(prev => [...prev, { event: 'error', data: e.data }])
       eventSource.close()
@@ -81,13 +104,25 @@ function App() {
     }
   }, [activeSessionId])
   const handleCreateSession = (newSession) => {
-    setSessions([newSession, ...sessions])
+    // A reused session (reuse: "return") is usually already in the history; just select it
+    if (!sessions.some(s => s.id === newSession.id)) {
+      setSessions([newSession, ...sessions])
+    }
     setActiveSessionId(newSession.id)
   }
   const handleDeleteSession = (id) => {
     setSessions(sessions.filter(s => s.id !== id))
     if (activeSessionId === id) setActiveSessionId(null)
   }
+  const cancelSession = async () => {
+    try {
+      const res = await fetch(`/sessions/${activeSessionId}/cancel`, { method: 'POST' })
+      if (!res.ok) throw new Error('Failed to cancel session')
+      toast.success('Session cancelled')
+    } catch (err) {
+      toast.error(err.message)
+    }
+  }
   const submitFeedback = async (text) => {
     try {
       const res = await fetch(`/sessions/${activeSessionId}/feedback`, {
@@ -143,6 +178,11 @@ function App() {
               <div className="page-subtitle">
                 Status: <span style={{ textTransform: 'uppercase', fontWeight: 600, color: 'var(--accent)' }}>{activeSession?.status?.replace('_', ' ')}</span>
               </div>
+              {['pending', 'queued', 'running', 'awaiting_feedback'].includes(activeSession?.status) && (
+                <button className="btn btn-danger" style={{ marginTop: 12 }} onClick={cancelSession}>
+                  Cancel Research
+                </button>
+              )}
             </div>
             {}
             <div style={{ padding: '0 40px 40px' }}>
@@ -192,7 +232,7 @@ function App() {
               {}
               {(activeSession?.status === 'running' || events.length > 0) && activeSession?.status !== 'completed' && (
                 <div style={{ marginBottom: 40 }}>
-                  <LiveProgress events={events} />
+                  <LiveProgress events={events} draft={draft} />
                 </div>
               )}
               {}
@@ -1,5 +1,6 @@
 import { useEffect, useRef } from 'react'
-export default function LiveProgress({ events }) {
+const DRAFT_ORDER = ['write_introduction', 'write_report', 'write_conclusion']
+export default function LiveProgress({ events, draft = {} }) {
     const containerRef = useRef(null)
     useEffect(() => {
         if (containerRef.current) {
@@ -32,6 +33,13 @@ export default function LiveProgress({ events }) {
                     )
                 })}
             </div>
+            {DRAFT_ORDER.some(node => draft[node]) && (
+                <div className="draft-preview">
+                    {DRAFT_ORDER.filter(node => draft[node]).map(node => (
+                        <div key={node} className="draft-block">{draft[node]}</div>
+                    ))}
+                </div>
+            )}
         </div>
     )
 }
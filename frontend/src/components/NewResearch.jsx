@@ -20,7 +20,12 @@ export default function NewResearch({ onCreated }) {
                 throw new Error(err.detail || 'Failed to create session')
             }
             const session = await res.json()
-            toast.success('Research started!')
+            if (session.reused) {
+                toast.success(`Showing earlier research on "${session.similar.topic}"`)
+            } else if (session.similar) {
+                toast(`Similar earlier research: "${session.similar.topic}"`)
+            }
+            if (!session.reused) toast.success('Research started!')
             setTopic('')
             setMaxAnalysts(3)
             onCreated(session)
@@ -3,10 +3,12 @@ import toast from 'react-hot-toast'
 function StatusBadge({ status }) {
     const map = {
         pending: { cls: 'badge-pending', label: 'Pending' },
+        queued: { cls: 'badge-pending', label: 'Queued' },
         running: { cls: 'badge-running', label: 'Running' },
         awaiting_feedback: { cls: 'badge-awaiting', label: 'Feedback' },
         completed: { cls: 'badge-completed', label: 'Done' },
         failed: { cls: 'badge-failed', label: 'Failed' },
+        cancelled: { cls: 'badge-failed', label: 'Cancelled' },
     }
     const { cls, label } = map[status] || { cls: 'badge-pending', label: status }
     return (